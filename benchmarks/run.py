@@ -0,0 +1,103 @@
+"""
+Times every stage of the pipeline on synthetic street networks and points.
+No network access is needed. Results are written as JSON, e.g.:
+  python run.py --nx 30 --ny 30 --irregular --output benchmark.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'linestringnize'))
+
+import numpy as np
+import shapely
+import geopandas as gpd
+
+import synthetic
+import linestringnize as pipeline
+from osm_roads import OSM
+from osm_to_geojson import osm_to_geojson
+
+
+LOCATION_ID = 'LocationNumbers'
+CHILD_ID = 'ID'
+
+
+def timed(func, *args, **kwargs):
+    """Returns the result of `func` and its wall time in seconds."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def run_stages(data, df, args):
+    """Runs all stages once and returns a dict of wall times."""
+    times = {}
+    df = pipeline.to_string(df.copy(), LOCATION_ID, CHILD_ID)
+    df, times['merge_identical_geometries'] = timed(pipeline.merge_identical_geometries, df,
+                                                    LOCATION_ID, CHILD_ID)
+    roads, times['osm_to_geojson'] = timed(osm_to_geojson, data)
+    osm = OSM.from_dataframe(roads)
+    df, times['group_by_block'] = timed(pipeline.group_by_block, df, osm)
+    df, times['group_by_distance'] = timed(pipeline.group_by_distance, df, args.max_distance,
+                                           osm, args.workers)
+    lines, times['to_linestring'] = timed(pipeline.to_linestring, df, osm, LOCATION_ID,
+                                          args.min_length, args.clipping, True, CHILD_ID,
+                                          args.workers)
+    lines, times['remove_intersections'] = timed(pipeline.remove_intersections, lines, 0,
+                                                 args.workers)
+    return times, {'roads': len(roads), 'groups': len(lines)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nx', required=False, type=int, default=20,
+                        help='number of intersections in x direction')
+    parser.add_argument('--ny', required=False, type=int, default=20,
+                        help='number of intersections in y direction')
+    parser.add_argument('--spacing', required=False, type=float, default=100.,
+                        help='distance in meters between intersections')
+    parser.add_argument('--irregular', required=False, action='store_true',
+                        help='if set, an irregular street network is generated')
+    parser.add_argument('--density', required=False, type=float, default=0.1,
+                        help='average number of points per meter of street side')
+    parser.add_argument('--jitter', required=False, type=float, default=0.5,
+                        help='standard deviation in meters of the point positions')
+    parser.add_argument('--side', required=False, type=str, default='both',
+                        choices=('both', 'left', 'right'),
+                        help='side of the street the points are placed on')
+    parser.add_argument('--max_distance', required=False, type=float, default=50.,
+                        help='maximum distance between two points to be connected by a line')
+    parser.add_argument('--min_length', required=False, type=float, default=30.,
+                        help='minimum length of a line')
+    parser.add_argument('--clipping', required=False, type=float, default=5.,
+                        help='minimum buffer in meter between line start/end and intersection')
+    parser.add_argument('--workers', required=False, type=int, default=1,
+                        help='number of worker processes, 0 uses all CPUs')
+    parser.add_argument('--repeat', required=False, type=int, default=3,
+                        help='number of repetitions, the minimum time is reported')
+    parser.add_argument('--seed', required=False, type=int, default=0,
+                        help='seed of the random generators')
+    parser.add_argument('--output', '-o', required=False, type=str, default='benchmark.json',
+                        help='path to the output file')
+    args = parser.parse_args()
+    data = synthetic.street_network(args.nx, args.ny, args.spacing, args.irregular, seed=args.seed)
+    df = synthetic.street_points(data, args.density, jitter=args.jitter, side=args.side,
+                                 location_id=LOCATION_ID, child_id=CHILD_ID, seed=args.seed)
+    runs = [run_stages(data, df, args) for _ in range(args.repeat)]
+    stages = {stage: min(times[stage] for times, _ in runs) for stage in runs[0][0]}
+    report = {
+        'parameters': vars(args),
+        'sizes': dict(runs[0][1], points=len(df)),
+        'stages': stages,
+        'total': sum(stages.values()),
+        'environment': {'python': platform.python_version(),
+                        'numpy': np.__version__,
+                        'shapely': shapely.__version__,
+                        'geopandas': gpd.__version__},
+    }
+    json.dump(report, open(args.output, 'w'), indent=2)
+    print(json.dumps(stages, indent=2))
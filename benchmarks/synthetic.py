@@ -0,0 +1,101 @@
+"""
+Generators of synthetic OSM street networks (in Overpass JSON format) and of
+on-street points along them.
+"""
+import numpy as np
+import geopandas as gpd
+from shapely.geometry import Point, LineString
+
+
+_METERS_PER_DEGREE = 111320.
+DEFAULT_ORIGIN = (-123.1, 49.28)
+
+
+def _to_degrees(origin, x, y):
+    """Converts offsets in meters from `origin` to lon/lat."""
+    return origin[0] + x / (_METERS_PER_DEGREE * np.cos(np.radians(origin[1]))), \
+           origin[1] + y / _METERS_PER_DEGREE
+
+
+def _ways(rng, sequence, max_nodes):
+    """Splits a sequence of node ids into ways of random length and direction."""
+    ways, k = [], 0
+    while k < len(sequence) - 1:
+        n = rng.integers(1, max_nodes + 1)
+        way = sequence[k:k+n+1]
+        ways.append(way if rng.random() < 0.5 else way[::-1])
+        k += n
+    return ways
+
+
+def street_network(nx, ny, spacing=100., irregular=False, origin=DEFAULT_ORIGIN, seed=0):
+    """Returns a street network of `nx` times `ny` intersections as Overpass
+      JSON. If `irregular` is True, intersections are displaced, some street
+      segments are removed and diagonal streets are added.
+    """
+    rng = np.random.default_rng(seed)
+    x, y = np.meshgrid(np.arange(nx) * spacing, np.arange(ny) * spacing, indexing='ij')
+    if irregular:
+        x = x + rng.normal(0, spacing / 8., x.shape)
+        y = y + rng.normal(0, spacing / 8., y.shape)
+    lon, lat = _to_degrees(origin, x, y)
+    ids = np.arange(1, nx * ny + 1).reshape(nx, ny)
+    elements = [{'type': 'node', 'id': int(ids[i, j]), 'lon': float(lon[i, j]), 'lat': float(lat[i, j])} \
+                for i in range(nx) for j in range(ny)]
+    streets = [ids[i, :].tolist() for i in range(nx)] + [ids[:, j].tolist() for j in range(ny)]
+    if irregular:
+        # Removes random segments, which splits streets into several parts
+        parts = []
+        for street in streets:
+            cuts = np.flatnonzero(rng.random(len(street) - 1) < 0.1) + 1
+            parts += [p for p in np.split(np.array(street), cuts) if len(p) > 1]
+        streets = [p.tolist() for p in parts]
+        for _ in range(max(1, min(nx, ny) // 4)):
+            i, j = rng.integers(0, nx - 1), rng.integers(0, ny - 1)
+            n = min(nx - i, ny - j)
+            streets.append([int(ids[i + k, j + k]) for k in range(n)])
+    way_id = 10**9
+    for street in streets:
+        for way in _ways(rng, street, 4):
+            elements.append({'type': 'way', 'id': way_id, 'nodes': [int(n) for n in way],
+                             'tags': {'highway': 'residential'}})
+            way_id += 1
+    return {'elements': elements}
+
+
+def street_points(data, density=0.1, offset=6., jitter=0.5, side='both', location_id='LocationNumbers',
+                  child_id='ID', seed=0):
+    """Returns on-street points along all ways in `data` as GeoDataFrame.
+      Arguments:
+        data: Dict. The OSM data in JSON format.
+        density: Float. Average number of points per meter of street side.
+        offset: Float. Distance in meters of the points from the street.
+        jitter: Float. Standard deviation in meters of the point positions.
+        side: String. One of 'both', 'left' or 'right'.
+      Returns:
+        A GeoDataFrame with columns `location_id` and `child_id`.
+    """
+    if side not in ('both', 'left', 'right'):
+        raise ValueError('Argument `side` has to be one of both, left or right.')
+    rng = np.random.default_rng(seed)
+    nodes = {obj['id']: (obj['lon'], obj['lat']) for obj in data['elements'] if obj['type'] == 'node'}
+    ways = [obj['nodes'] for obj in data['elements'] if obj['type'] == 'way']
+    lat = np.mean([c[1] for c in nodes.values()])
+    scale = np.array([_METERS_PER_DEGREE * np.cos(np.radians(lat)), _METERS_PER_DEGREE])
+    points, locations = [], []
+    for w, way in enumerate(ways):
+        xy = np.array([nodes[n] for n in way]) * scale
+        line = LineString(xy)
+        for s in ((-1, 1) if side == 'both' else ((1,) if side == 'left' else (-1,))):
+            d = np.sort(rng.uniform(0, line.length, rng.poisson(density * line.length)))
+            for di in d:
+                p, q = line.interpolate(di), line.interpolate(min(di + 1., line.length))
+                if p.equals(q):
+                    q, p = p, line.interpolate(di - 1.)
+                normal = np.array([p.y - q.y, q.x - p.x]) / p.distance(q)
+                xy_point = np.array([p.x, p.y]) + s * offset * normal + rng.normal(0, jitter, 2)
+                points.append(Point(xy_point / scale))
+                locations.append('%d%s' % (w, 'L' if s > 0 else 'R'))
+    return gpd.GeoDataFrame({location_id: locations,
+                             child_id: [str(i) for i in range(len(points))]},
+                            geometry=points, crs='EPSG:4326')
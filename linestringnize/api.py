@@ -0,0 +1,124 @@
+"""
+Programmatic interface which keeps a road network in memory, so many point
+layers of the same area are converted without any setup cost.
+"""
+import geopandas as gpd
+from shapely.geometry import Point
+
+import utils
+import profiling
+import incremental
+import linestringnize as pipeline
+from osm_roads import OSM
+
+
+class Linestringnizer:
+    """Converts on-street points to block-wise LineStrings. The road network
+      is loaded on first use and grows whenever an input extends past the
+      area loaded so far.
+      Arguments:
+        bbox: Tuple or None. Area of the road network to load upfront.
+        location_id: String. Name of the location numbers property.
+        child_id: String or None. Name of the feature ID property.
+        max_distance: Float. Maximum distance between two points to be
+          connected by a line.
+        min_length: Float. Minimum length of a line.
+        clipping: Float. Minimum buffer in meter between line start/end and
+          intersection.
+        stats: Boolean. If true, the output contains statistics on the
+          aggregations.
+        workers: Integer. Number of worker processes, 0 uses all CPUs.
+        projected: Boolean. If true, points and roads are projected to a
+          local metric CRS and all distances are planar.
+        score: String. Score matching a group of points to a road, one of
+          `SCORES` in linestringnize.
+        merge_tolerance: Float or None. If set, points within this distance
+          in meters of each other, directly or through other points, are
+          merged.
+        osm_options: Keyword arguments passed on to `OSM`.
+    """
+    def __init__(self, bbox=None, location_id='LocationNumbers', child_id=None, max_distance=50.,
+                 min_length=30., clipping=5., stats=True, workers=1, projected=False,
+                 score='sum', merge_tolerance=None,
+                 **osm_options):
+        self.params = {'location_id': location_id, 'child_id': child_id,
+                       'max_distance': max_distance, 'min_length': min_length,
+                       'clipping': clipping, 'stats': stats, 'workers': workers,
+                       'projected': projected, 'score': score}
+        self.merge_tolerance = merge_tolerance
+        self.osm_options = osm_options
+        self.osm = None
+        if bbox is not None:
+            self.load(bbox)
+
+    def covers(self, bbox):
+        """Returns True if the loaded road network contains `bbox`."""
+        return self.osm is not None and \
+               self.osm.bbox[0] <= bbox[0] and self.osm.bbox[1] <= bbox[1] and \
+               self.osm.bbox[2] >= bbox[2] and self.osm.bbox[3] >= bbox[3]
+
+    def load(self, bbox):
+        """Loads the road network of `bbox` together with the area loaded so far."""
+        if self.osm is not None:
+            bbox = (min(bbox[0], self.osm.bbox[0]), min(bbox[1], self.osm.bbox[1]),
+                    max(bbox[2], self.osm.bbox[2]), max(bbox[3], self.osm.bbox[3]))
+        self.osm = OSM(bbox, **self.osm_options)
+        return self.osm
+
+    def to_frame(self, data):
+        """Returns `data` as GeoDataFrame. `data` is a GeoDataFrame, a
+          GeoSeries or an iterable of Points or (Point, properties) tuples.
+          Missing ID columns are filled with empty strings.
+        """
+        if isinstance(data, gpd.GeoSeries):
+            df = gpd.GeoDataFrame(geometry=data)
+        elif isinstance(data, gpd.GeoDataFrame):
+            df = data
+        else:
+            rows = [(x, {}) if isinstance(x, Point) else x for x in data]
+            df = gpd.GeoDataFrame([p for _, p in rows], geometry=[g for g, _ in rows],
+                                  crs='EPSG:4326')
+        for column in (self.params['location_id'], self.params['child_id']):
+            if column and column not in df.columns:
+                df = df.assign(**{column: ''})
+        return df.reset_index(drop=True)
+
+    def _points(self, data, params):
+        """Returns the prepared points and other geometries of `data` and
+          loads the road network they need.
+        """
+        ids = [c for c in (params['location_id'], params['child_id']) if c]
+        with profiling.stage('merge_identical_geometries'):
+            df = pipeline.prepare(self.to_frame(data), *ids, tolerance=self.merge_tolerance)
+        df_points, df_other = utils.filter_geometry(df, 'Point')
+        if len(df_points):
+            bbox = utils.extend_bounds(df_points.total_bounds, pipeline._EXTEND_BBOX)
+            if not self.covers(bbox):
+                self.load(bbox)
+        return df_points, df_other
+
+    def run(self, data, **params):
+        """Converts the points in `data` to LineStrings. Geometries other than
+          Points are passed through. Keyword arguments override the
+          parameters given at construction.
+        """
+        params = dict(self.params, **params)
+        df_points, df_other = self._points(data, params)
+        if len(df_points) == 0:
+            return df_other
+        df_lines = pipeline.linestringnize(df_points.copy(), self.osm, **params)
+        return utils.concat_dfs(df_lines, df_other)
+
+    def update(self, previous, data, changed, **params):
+        """Patches `previous`, the output of `run` for an earlier version of
+          `data`, by recomputing only the lines affected by the `changed`
+          IDs. Requires the `child_id` parameter and the same road network.
+          Updates always run in lon/lat, `projected` is ignored.
+        """
+        params = dict(self.params, **params)
+        params.pop('projected')
+        df_points, df_other = self._points(data, params)
+        if len(df_points) == 0:
+            return df_other
+        df_lines = incremental.update(previous, df_points, changed, self.osm, **params)
+        return utils.concat_dfs(df_lines, df_other)
@@ -0,0 +1,183 @@
+"""
+Runs many jobs of a manifest in one process pool. Jobs whose inputs overlap
+are grouped, so every road network is built once and shared by all jobs of
+a group. Groups are scheduled over the workers, largest first. With fewer
+groups than workers, the jobs of each group are spread over the workers
+instead, once its road network is loaded. A failing job is recorded in the
+summary and does not stop the other jobs, e.g.:
+  python batch.py --manifest jobs.json --summary summary.json --workers 4
+The manifest is a JSON list of jobs or a dict with keys `jobs` and
+`defaults`. A job has the keys `input` and `output` and optionally any of
+PARAMETERS, which override the defaults.
+"""
+import time
+import json
+import argparse
+import traceback
+import pyogrio
+import geopandas as gpd
+
+import utils
+import parallel
+import api
+import linestringnize as pipeline
+
+
+PARAMETERS = ('location_id', 'id', 'max_distance', 'min_length', 'clipping', 'stats', 'score',
+              'projected', 'precision')
+DEFAULTS = {'location_id': 'LocationNumbers', 'id': None, 'max_distance': 50., 'min_length': 30.,
+            'clipping': 5., 'stats': True, 'score': 'sum', 'projected': False, 'precision': None}
+
+
+def load_manifest(path):
+    """Returns the list of jobs in a manifest with all defaults applied."""
+    manifest = json.load(open(path, 'r'))
+    if isinstance(manifest, list):
+        manifest = {'jobs': manifest}
+    defaults = dict(DEFAULTS, **manifest.get('defaults', {}))
+    jobs = []
+    for job in manifest['jobs']:
+        if 'input' not in job or 'output' not in job:
+            raise ValueError('Every job needs an input and an output.')
+        unknown = set(job) - set(PARAMETERS) - {'input', 'output'}
+        if unknown:
+            raise ValueError('Unknown job parameters: %s.' % ', '.join(sorted(unknown)))
+        jobs.append(dict(defaults, **job))
+    return jobs
+
+
+def input_bounds(path):
+    """Returns the bounds of the features in `path`. GeoParquet files store
+      them in their metadata, files without it are read for their geometry
+      column only. Other formats are scanned by GDAL without loading the
+      features.
+    """
+    if path.lower().endswith(('.parquet', '.geoparquet')):
+        import pyarrow.parquet as pq
+        metadata = json.loads(pq.read_schema(path).metadata[b'geo'])
+        column = metadata['primary_column']
+        bbox = metadata['columns'][column].get('bbox')
+        if bbox:
+            return tuple(map(float, bbox))
+        return tuple(gpd.read_parquet(path, columns=[column]).total_bounds)
+    return tuple(pyogrio.read_info(path, force_total_bounds=True)['total_bounds'])
+
+
+def _overlap(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def group_by_bounds(bounds):
+    """Returns groups of the indexes of `bounds` which overlap directly or
+      through other bounds.
+    """
+    parent = list(range(len(bounds)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(len(bounds)):
+        for j in range(i):
+            if _overlap(bounds[i], bounds[j]):
+                parent[find(i)] = find(j)
+    groups = {}
+    for i in range(len(bounds)):
+        groups.setdefault(find(i), []).append(i)
+    return list(groups.values())
+
+
+def run_job(job, linestringnizer):
+    """Runs a single job and returns its summary."""
+    start = time.perf_counter()
+    df = utils.load_file(job['input'])
+    df_final = linestringnizer.run(df, location_id=job['location_id'], child_id=job['id'],
+                                   max_distance=job['max_distance'], min_length=job['min_length'],
+                                   clipping=job['clipping'], stats=job['stats'], score=job['score'],
+                                   projected=job['projected'])
+    utils.save_file(df_final, job['output'], job['precision'])
+    return {'features': len(df), 'lines': int((df_final.geom_type == 'LineString').sum()),
+            'seconds': time.perf_counter() - start}
+
+
+def _failure(error):
+    return {'status': 'failed', 'error': '%s: %s' % (type(error).__name__, error),
+            'traceback': traceback.format_exc()}
+
+
+def _run_job(job, linestringnizer):
+    summary = {'input': job['input'], 'output': job['output']}
+    try:
+        summary.update(run_job(job, linestringnizer), status='done')
+    except Exception as error:
+        summary.update(_failure(error))
+    return summary
+
+
+def run_group(group, osm_options, workers=1):
+    """Runs all jobs of `group`, a list of (job, bounds) tuples, on one road
+      network, which is loaded once and shared by `workers` processes.
+      Returns a summary per job.
+    """
+    bbox = [min(b[0] for _, b in group), min(b[1] for _, b in group),
+            max(b[2] for _, b in group), max(b[3] for _, b in group)]
+    start = time.perf_counter()
+    try:
+        linestringnizer = api.Linestringnizer(bbox, **osm_options)
+    except Exception as error:
+        return [dict(_failure(error), input=job['input'], output=job['output']) for job, _ in group]
+    seconds = time.perf_counter() - start
+    summaries = parallel.map_groups(_run_job, [job for job, _ in group], workers, linestringnizer,
+                                    chunksize=1)
+    return [dict(summary, road_network_seconds=seconds) for summary in summaries]
+
+
+def run(jobs, workers=1, **osm_options):
+    """Runs all `jobs` on `workers` processes. Returns a summary per job in
+      the order of `jobs`. If there are at least as many groups as workers,
+      groups run in parallel, otherwise the jobs of every group do.
+    """
+    summaries, located = [None] * len(jobs), []
+    for i, job in enumerate(jobs):
+        try:
+            bounds = utils.extend_bounds(input_bounds(job['input']), pipeline._EXTEND_BBOX)
+            located.append((i, bounds))
+        except Exception as error:
+            summaries[i] = dict(_failure(error), input=job['input'], output=job['output'])
+    groups = [[located[k] for k in group] for group in group_by_bounds([b for _, b in located])]
+    groups.sort(key=len, reverse=True)
+    grouped_jobs = [[(jobs[i], b) for i, b in group] for group in groups]
+    if len(groups) >= parallel.num_workers(workers):
+        results = parallel.map_groups(run_group, grouped_jobs, workers, osm_options, chunksize=1)
+    else:
+        results = [run_group(group, osm_options, workers) for group in grouped_jobs]
+    for group, result in zip(groups, results):
+        for (i, _), summary in zip(group, result):
+            summaries[i] = summary
+    return summaries
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--manifest', '-m', required=True, type=str,
+                        help='path to the JSON manifest of jobs')
+    parser.add_argument('--summary', '-s', required=False, type=str,
+                        default='summary.json',
+                        help='path to the JSON summary of all jobs')
+    parser.add_argument('--workers', '-w', required=False, type=int,
+                        default=1,
+                        help='number of worker processes, 0 uses all CPUs')
+    parser.add_argument('--osm_file', required=False, type=str,
+                        default=None,
+                        help='path to a local .osm or .osm.pbf extract used instead of Overpass')
+    args = parser.parse_args()
+    start = time.perf_counter()
+    summaries = run(load_manifest(args.manifest), args.workers, osm_file=args.osm_file)
+    failed = [s for s in summaries if s['status'] != 'done']
+    json.dump({'jobs': summaries, 'failed': len(failed), 'seconds': time.perf_counter() - start},
+              open(args.summary, 'w'), indent=2)
+    print('%d of %d jobs done.' % (len(summaries) - len(failed), len(summaries)))
+    for summary in failed:
+        print('Failed %s: %s' % (summary['input'], summary['error']))
@@ -0,0 +1,165 @@
+"""
+Batched distance computations on arrays of lon/lat coordinates.
+All functions take NumPy arrays and compute every distance in one call, either
+with `pyproj.Geod.inv` or with a local approximation on the WGS84 ellipsoid
+which falls back to the geodesic wherever its error bound is exceeded. For
+coordinates in a projected metric CRS, the planar method applies.
+"""
+import contextlib
+import pyproj
+import numpy as np
+import shapely
+
+
+_GEOD = pyproj.Geod(ellps='WGS84')
+
+# WGS84 semi-major axis and first eccentricity squared
+_A = 6378137.0
+_E2 = 6.69437999014e-3
+
+# Distance methods
+GEODESIC = 'geodesic'
+LOCAL = 'local'
+PLANAR = 'planar'
+METHODS = (GEODESIC, LOCAL, PLANAR)
+
+_config = {'method': GEODESIC, 'tolerance': 0.01}
+
+
+def GEOD():
+    return _GEOD
+
+
+def configure(method=None, tolerance=None):
+    """Sets the default distance method and the accuracy bound (meters) of
+      the local approximation.
+    """
+    if method is not None:
+        if method not in METHODS:
+            raise ValueError('Argument `method` has to be one of %s.' % ', '.join(METHODS))
+        _config['method'] = method
+    if tolerance is not None:
+        if tolerance < 0:
+            raise ValueError('Argument `tolerance` has to be non-negative.')
+        _config['tolerance'] = float(tolerance)
+
+
+def method():
+    """Returns the default distance method."""
+    return _config['method']
+
+
+@contextlib.contextmanager
+def using(method=None, tolerance=None):
+    """Temporarily changes the default distance method and tolerance."""
+    previous = dict(_config)
+    configure(method, tolerance)
+    try:
+        yield
+    finally:
+        _config.update(previous)
+
+
+def _geodesic(lon1, lat1, lon2, lat2):
+    if lon1.size == 0:
+        return np.zeros(lon1.shape)
+    return np.asarray(_GEOD.inv(lon1, lat1, lon2, lat2)[2], dtype=float)
+
+
+def _local(lon1, lat1, lon2, lat2):
+    """Planar distance using the ellipsoid's radii of curvature at the mean
+      latitude of each pair.
+    """
+    phi = np.radians((lat1 + lat2) / 2.)
+    w = 1. - _E2 * np.sin(phi)**2
+    n = _A / np.sqrt(w)
+    m = _A * (1. - _E2) / w**1.5
+    dlon = (lon2 - lon1 + 180.) % 360. - 180.
+    return np.hypot(np.radians(dlon) * n * np.cos(phi), np.radians(lat2 - lat1) * m)
+
+
+def _local_error(d, lat1, lat2):
+    """Upper bound (meters) of the error of `_local` for a distance `d`."""
+    cos = np.cos(np.radians(np.maximum(np.abs(lat1), np.abs(lat2))))
+    with np.errstate(divide='ignore'):
+        return d**3 / (16. * _A**2 * cos**2)
+
+
+def distances(lon1, lat1, lon2, lat2, method=None, tolerance=None):
+    """Returns the element-wise distances in meters between two sets of
+      coordinates. All arguments are broadcast against each other. With the
+      planar method, the coordinates are expected in meters.
+    """
+    method = method or _config['method']
+    tolerance = _config['tolerance'] if tolerance is None else tolerance
+    lon1, lat1, lon2, lat2 = [np.asarray(a, dtype=float) for a in \
+                              np.broadcast_arrays(lon1, lat1, lon2, lat2)]
+    shape = lon1.shape
+    lon1, lat1, lon2, lat2 = lon1.ravel(), lat1.ravel(), lon2.ravel(), lat2.ravel()
+    if method == GEODESIC:
+        d = _geodesic(lon1, lat1, lon2, lat2)
+    elif method == PLANAR:
+        d = np.hypot(lon2 - lon1, lat2 - lat1)
+    elif method == LOCAL:
+        d = _local(lon1, lat1, lon2, lat2)
+        inexact = _local_error(d, lat1, lat2) > tolerance
+        if inexact.any():
+            d[inexact] = _geodesic(lon1[inexact], lat1[inexact], lon2[inexact], lat2[inexact])
+    else:
+        raise ValueError('Argument `method` has to be one of %s.' % ', '.join(METHODS))
+    return d.reshape(shape)
+
+
+def to_xy(geoms):
+    """Returns an (N, 2) array with the coordinates of the given Points."""
+    return shapely.get_coordinates(np.asarray(geoms, dtype=object))
+
+
+def pairwise(xy1, xy2, **kwargs):
+    """Returns the distances between the rows of two (N, 2) arrays."""
+    xy1, xy2 = np.asarray(xy1, dtype=float), np.asarray(xy2, dtype=float)
+    return distances(xy1[..., 0], xy1[..., 1], xy2[..., 0], xy2[..., 1], **kwargs)
+
+
+def path_lengths(xy, **kwargs):
+    """Returns the distances between consecutive rows of an (N, 2) array."""
+    xy = np.asarray(xy, dtype=float)
+    return pairwise(xy[:-1], xy[1:], **kwargs)
+
+
+def length(xy, **kwargs):
+    """Returns the total length in meters of a path given as (N, 2) array."""
+    return float(path_lengths(xy, **kwargs).sum())
+
+
+def triangle(xy, **kwargs):
+    """Returns the distances of all pairs (i, j) with j < i, ordered row-wise
+      as given by `np.tril_indices(len(xy), -1)`.
+    """
+    xy = np.asarray(xy, dtype=float)
+    i, j = np.tril_indices(len(xy), -1)
+    return pairwise(xy[i], xy[j], **kwargs)
+
+
+def matrix(xy1, xy2=None, **kwargs):
+    """Returns the matrix of distances between all rows of `xy1` and `xy2`.
+      If `xy2` is None, the symmetric matrix of `xy1` is returned.
+    """
+    xy1 = np.asarray(xy1, dtype=float)
+    if xy2 is None:
+        D = np.zeros((len(xy1), len(xy1)))
+        i, j = np.tril_indices(len(xy1), -1)
+        D[i, j] = D[j, i] = triangle(xy1, **kwargs)
+        return D
+    xy2 = np.asarray(xy2, dtype=float)
+    return pairwise(xy1[:, None, :], xy2[None, :, :], **kwargs)
+
+
+def geometry_distances(geoms1, geoms2, **kwargs):
+    """Returns the distances in meters between the closest points of two
+      (broadcast) arrays of geometries.
+    """
+    lines = shapely.shortest_line(np.asarray(geoms1, dtype=object), np.asarray(geoms2, dtype=object))
+    shape = np.shape(lines)
+    xy = shapely.get_coordinates(np.ravel(lines)).reshape(-1, 2, 2)
+    return pairwise(xy[:, 0], xy[:, 1], **kwargs).reshape(shape)
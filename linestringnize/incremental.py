@@ -0,0 +1,109 @@
+"""
+Incremental re-processing of a previous output when only some input points
+changed. Points are keyed by their street block side (see `block_key`), and
+only block sides touched by a change are recomputed, together with the lines
+touching them. All other lines of the previous output are kept as they are.
+Block keys are only stable if the road network did not change, i.e. the
+previous output was computed with the same (cached) network.
+"""
+import numpy as np
+import pandas as pd
+import shapely
+
+import utils
+import linestringnize as pipeline
+
+
+# Lines closer than this (degrees) are considered touching
+_TOUCH_TOLERANCE = 1e-7
+
+
+def split_ids(values, sep=','):
+    """Returns a Series mapping every single ID in `values` to its row label."""
+    ids = values.dropna().astype(str).str.split(sep).explode()
+    return pd.Series(ids.index, index=ids.values)
+
+
+def touching(tree, geoms, candidates):
+    """Returns the positions in `candidates` of all tree geometries touching
+      any of `geoms`.
+    """
+    if len(geoms) == 0:
+        return set()
+    hits = tree.query(np.asarray(geoms, dtype=object), predicate='dwithin', distance=_TOUCH_TOLERANCE)[1]
+    return set(np.unique(hits).tolist()) & candidates
+
+
+def update(previous, df_points, changed, osm, location_id, child_id, max_distance, min_length,
+           clipping, stats=True, workers=1, score='sum', sep=','):
+    """Patches `previous` for the `changed` IDs.
+      Arguments:
+        previous: GeoDataFrame. A previous output with column `AGG_IDS`,
+          rows without IDs (passed through geometries) are dropped.
+        df_points: GeoDataFrame. All current input points, prepared.
+        changed: Iterable of Strings. IDs of added, removed or moved points.
+        osm: OSM object. The road network `previous` was computed with.
+      Returns:
+        A GeoDataFrame of lines in which the lines of all affected block
+        sides and their touching lines are recomputed.
+    """
+    if not child_id or pipeline.AGG_IDS not in previous.columns:
+        raise ValueError('Incremental mode requires the feature ID property and a previous output with column %s.' \
+                         % pipeline.AGG_IDS)
+    lines = previous[previous[pipeline.AGG_IDS].notna()].reset_index(drop=True)
+    line_of_id = split_ids(lines[pipeline.AGG_IDS], sep)
+    df = pipeline.group_by_block(df_points.copy(), osm)
+    point_of_id = split_ids(df[child_id], sep)
+    tree = shapely.STRtree(np.asarray(lines.geometry))
+
+    def keys_of(ids):
+        return set(df.loc[point_of_id[point_of_id.index.isin(ids)], pipeline.GROUP])
+
+    def lines_of(ids):
+        return set(line_of_id[line_of_id.index.isin(ids)].tolist())
+
+    def close(keys, dirty):
+        """Adds all block sides of dirty lines and all lines of dirty block sides."""
+        while True:
+            keys = keys | keys_of(split_ids(lines.loc[sorted(dirty), pipeline.AGG_IDS], sep).index)
+            affected = df[df[pipeline.GROUP].isin(keys)]
+            extended = dirty | lines_of(split_ids(affected[child_id], sep).index)
+            if extended == dirty:
+                return keys, dirty, affected
+            dirty = extended
+
+    def recompute(affected):
+        if len(affected) == 0:
+            return lines.iloc[:0]
+        affected = pipeline.group_by_distance(affected.copy(), max_distance, osm, workers)
+        new_lines = pipeline.to_linestring(affected, osm, location_id, min_length, clipping, stats,
+                                           child_id, workers, score)
+        return new_lines.set_crs(lines.crs) if lines.crs else new_lines
+
+    def rebuild(rows):
+        """Returns the lines of `rows` as they were before their intersections
+          were removed, built again from their unchanged points.
+        """
+        ids = split_ids(lines.loc[rows, pipeline.AGG_IDS], sep)
+        line_of_point = pd.Series(ids.values, index=point_of_id.loc[ids.index].values)
+        line_of_point = line_of_point[~line_of_point.index.duplicated()].sort_index()
+        points = df.loc[line_of_point.index].assign(**{pipeline.GROUP: line_of_point.values})
+        return pipeline.to_linestring(points, osm, location_id, min_length, clipping, False, None,
+                                      workers, score)
+
+    changed = set(str(c) for c in changed)
+    kept = set(range(len(lines)))
+    keys, dirty, affected = close(keys_of(changed), lines_of(changed))
+    new_lines = recompute(affected)
+    # Lines touching changed lines were trimmed against them, hence are recomputed
+    ring = touching(tree, list(new_lines.geometry) + list(lines.geometry[sorted(dirty)]), kept - dirty)
+    if ring:
+        keys, dirty, affected = close(keys, dirty | ring)
+        new_lines = recompute(affected)
+    if len(new_lines):
+        # A full run trims against untrimmed lines, hence the outer lines are rebuilt
+        outer = sorted(touching(tree, list(new_lines.geometry), kept - dirty))
+        combined = utils.concat_dfs(new_lines, rebuild(outer)[['geometry']]) if outer else new_lines
+        new_lines = pipeline.remove_intersections(combined, 0, workers).iloc[:len(new_lines)]
+    lines = lines.drop(index=sorted(dirty))
+    return utils.concat_dfs(lines, new_lines)
@@ -1,20 +1,30 @@
 import argparse
+import cProfile
 import numpy as np
+import pandas as pd
+import shapely
 import geopandas as gpd
 from shapely.geometry import Point, LineString, MultiLineString
 from tsp_solver.greedy import solve_tsp as solve_travelling_salesman_problem
 
 import utils
-from osm_roads import OSM
-from spatial_search import RTree
+import geodesic
+import parallel
+import profiling
+import projection
+import road_metrics
 
 
 # Parameters
 _EXTEND_BBOX = 100
 _LINE_TO_POINTS_INTERVAL = 5.0
+_TSP_MAX_POINTS = 100
+_METERS_PER_DEGREE = 111320.
+SCORES = ('sum', 'hausdorff', 'frechet')
 
 # New DataFrame columns
 GROUP = "_GROUP"
+ROAD = "_ROAD"
 AGG_IDS = '_AGG_IDS'
 AGG_COUNT = '_AGG_COUNT'
 AGG_DIST_MIN = '_AGG_DIST_MIN'
@@ -38,25 +48,101 @@ def merge_values(df, column, sep=','):
     return sep.join(df[column].unique())
 
 
-def merge_identical_geometries(df, *columns):
-    """Merges `columns` of identical geometries in `df` and then drops duplicates."""
-    # Assumes that df.index == range(len(df))
-    drop = np.zeros(len(df), dtype=bool)
-    grouped = df.assign(wkb=df.geometry.apply(lambda x: x.wkb_hex)).groupby('wkb', sort=False)
-    for _, group in grouped.filter(lambda x: len(x) > 1).groupby('wkb', sort=False):
+def geometry_keys(geoms, tolerance=None):
+    """Returns an integer key for every geometry, numbered in order of first
+      appearance. Points are keyed by their coordinates, all other geometries
+      by their WKB. If `tolerance` is given, points within `tolerance` meters
+      of each other share a key, also through chains of such points. Empty
+      and missing geometries are keyed by their WKB as well, all missing
+      geometries share one key.
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    keys = np.empty(len(geoms), dtype=np.int64)
+    is_point = (shapely.get_type_id(geoms) == 0) & ~shapely.is_empty(geoms)
+    xy = shapely.get_coordinates(geoms[is_point])
+    x, y = pd.factorize(xy[:, 0])[0], pd.factorize(xy[:, 1])[0]
+    keys[is_point] = pd.factorize(x * (y.max(initial=0) + 1) + y)[0]
+    if tolerance and len(xy):
+        keys[is_point] = close_points(xy, keys[is_point], tolerance)
+    wkb = pd.factorize(shapely.to_wkb(geoms[~is_point]), use_na_sentinel=False)[0]
+    keys[~is_point] = wkb + keys[is_point].max(initial=-1) + 1
+    return pd.factorize(keys)[0]
+
+
+def close_points(xy, keys, tolerance):
+    """Returns the lowest key of all points within `tolerance` meters of each
+      point of `xy`, also through chains of such points. Points of equal
+      `keys` are identical and numbered from 0.
+    """
+    unique = np.unique(keys, return_index=True)[1]
+    lon, lat = xy[unique].T
+    # Degrees covering `tolerance` meters at the highest latitude, refined geodesically
+    radius = tolerance / _METERS_PER_DEGREE / np.cos(np.radians(min(np.abs(lat).max(), 89.)))
+    points = shapely.points(xy[unique])
+    i, j = shapely.STRtree(points).query(points, predicate='dwithin', distance=radius)
+    close = (i < j) & (geodesic.distances(lon[i], lat[i], lon[j], lat[j]) <= tolerance)
+    return utils.connected_components(len(unique), i[close], j[close])[keys]
+
+
+def merge_identical_geometries(df, *columns, tolerance=None, sep=','):
+    """Merges `columns` of identical geometries in `df` and then drops
+      duplicates. If `tolerance` is given, points within `tolerance` meters
+      of each other, directly or through other points, are considered
+      identical.
+    """
+    keys = geometry_keys(df.geometry, tolerance)
+    first = np.unique(keys, return_index=True)[1]
+    result = df.iloc[first].copy()
+    duplicated = np.bincount(keys)[keys] > 1
+    if columns and duplicated.any():
+        merged = df[list(columns)][duplicated].groupby(keys[duplicated], sort=False) \
+                   .agg(lambda values: sep.join(values.unique()))
         for column in columns:
-            df.loc[group.index[0], column] = merge_values(group, column)
-        drop[group.index[1:]] = True
-    return df.drop(df.index[drop])
+            result.iloc[merged.index.to_numpy(), result.columns.get_loc(column)] = merged[column].to_numpy()
+    return result
+
+
+def tsp_matrix(xy):
+    """Returns the lower-triangular distance matrix of the coordinates `xy`
+      in the row format expected by the tsp-solver.
+    """
+    return np.split(geodesic.triangle(xy), np.cumsum(np.arange(len(xy) - 1)))
+
 
+def _pairs_by_dist(N, distances):
+    """Returns all pairs (i, j) with j < i sorted by their distance."""
+    i, j = np.tril_indices(N, -1)
+    order = np.argsort(np.concatenate(distances), kind='stable')
+    return zip(i[order].tolist(), j[order].tolist())
 
-def solve_tsp(df):
+
+def projection_order(df, line=None):
+    """Returns the integer-location based indexes of all points in `df` sorted
+      along `line`. If `line` is None, the points are sorted along their
+      principal axis.
+    """
+    if line is not None:
+        d = shapely.line_locate_point(line, np.asarray(df.geometry))
+    else:
+        xy = geodesic.to_xy(df.geometry)
+        # Lon/lat degrees are scaled to equal lengths, projected meters are not
+        scale = [1., 1.] if geodesic.method() == geodesic.PLANAR else [np.cos(np.radians(xy[:, 1].mean())), 1.]
+        xy = (xy - xy.mean(axis=0)) * scale
+        d = xy @ np.linalg.svd(xy, full_matrices=False)[2][0]
+    return np.argsort(d, kind='stable').tolist()
+
+
+@profiling.timed
+def solve_tsp(df, line=None):
     """Solves the travelling salesman problem for all points in `df`.
       Returns a list of integer-location based indexes of the TSP path.
+      Groups larger than `_TSP_MAX_POINTS` are nearly collinear, hence they
+      are ordered by their projection onto `line` instead.
     """
-    D = [[utils.distance(df.iloc[i]['geometry'], df.iloc[j]['geometry']) for j in range(i)] \
-          for i in range(len(df))]
-    return solve_travelling_salesman_problem(D)
+    if len(df) > _TSP_MAX_POINTS:
+        return projection_order(df, line)
+    return solve_travelling_salesman_problem(tsp_matrix(geodesic.to_xy(df.geometry)),
+                                             pairs_by_dist=_pairs_by_dist)
 
 
 def line_to_points(line, interval):
@@ -67,22 +153,60 @@ def line_to_points(line, interval):
     if not isinstance(line, LineString):
         raise ValueError('Argument `line` is expected to be a LineString.')
     length = utils.line_length(line)
-    return [line.interpolate(0)] + \
-           [line.interpolate(interval/length * i, normalized=True) \
-               for i in range(1, int(np.ceil(length/interval)))] + \
-           [line.interpolate(1, normalized=True)]
+    fractions = np.append(interval / length * np.arange(int(np.ceil(length / interval))), 1.)
+    return list(shapely.line_interpolate_point(line, fractions, normalized=True))
 
 
-def get_nearest_line_id(geom, osm, interval):
-    """Returns the index of the closest line in `osm` to `geom`."""
+def _frechet(D):
+    """Returns the discrete Frechet distances of a stack of (n, m) distance
+      matrices `D`, filling the coupling table one anti-diagonal at a time.
+    """
+    k, n, m = D.shape
+    C = np.full((k, n + 1, m + 1), np.inf)
+    C[:, 1, 1] = D[:, 0, 0]
+    for diagonal in range(1, n + m - 1):
+        i = np.arange(max(0, diagonal - m + 1), min(n - 1, diagonal) + 1)
+        j = diagonal - i
+        previous = np.minimum(np.minimum(C[:, i, j + 1], C[:, i, j]), C[:, i + 1, j])
+        C[:, i + 1, j + 1] = np.maximum(previous, D[:, i, j])
+    return C[:, n, m]
+
+
+def match_scores(points, candidates, score='sum'):
+    """Returns a score for every line in `candidates` of how well it matches
+      the sequence of `points`, lower is better. `score` is one of SCORES:
+      the sum or maximum (directed Hausdorff) of the point to line distances,
+      or the discrete Frechet distance to the part of the line between the
+      projections of the first and last point.
+    """
+    if score not in SCORES:
+        raise ValueError('Argument `score` has to be one of %s.' % ', '.join(SCORES))
+    points, candidates = np.asarray(points, dtype=object), np.asarray(candidates, dtype=object)
+    if score == 'frechet':
+        start = shapely.line_locate_point(candidates, points[0])
+        end = shapely.line_locate_point(candidates, points[-1])
+        positions = start[:, None] + (end - start)[:, None] * np.linspace(0., 1., len(points))
+        samples = shapely.line_interpolate_point(candidates[:, None], positions)
+        xy = shapely.get_coordinates(samples.ravel()).reshape(len(candidates), len(points), 2)
+        D = geodesic.pairwise(geodesic.to_xy(points)[None, :, None, :], xy[:, None, :, :])
+        return _frechet(D)
+    d = geodesic.geometry_distances(points[:, None], candidates[None, :])
+    return d.sum(axis=0) if score == 'sum' else d.max(axis=0)
+
+
+@profiling.timed
+def get_nearest_line_id(geom, osm, interval, score='sum'):
+    """Returns the index of the closest line in `osm` to `geom`. LineStrings
+      are sampled every `interval` meters and matched by `score`.
+    """
     if not isinstance(geom, Point) and not isinstance(geom, LineString):
         raise ValueError('Argument `geom` is expected to be a Point or LineString.')
     knn = osm.nearest_ids(geom.bounds)
+    candidates = osm.get_id(knn)
     if isinstance(geom, Point):
-        d = [utils.distance(geom, osm.get_id(id)) for id in knn]
+        d = utils.distances(candidates, geom)
     else:
-        sequence = line_to_points(geom, interval)
-        d = [sum([utils.distance(p, osm.get_id(id)) for p in sequence]) for id in knn]
+        d = match_scores(line_to_points(geom, interval), candidates, score)
     return knn[np.argmin(d)]
 
 
@@ -93,16 +217,44 @@ def get_nearest_line(geom, osm, interval):
     return osm.get_id(get_nearest_line_id(geom, osm, interval))
 
 
-def group_by_block(df, osm):
+def nearest_line_ids(points, osm):
+    """Returns the integer-location based indexes of the closest line in `osm`
+      for all `points` at once, measured in a local metric CRS.
+    """
+    transformer, _, tree = osm.local_index()
+    if transformer is not None:
+        points = projection.transform(points, transformer)
+    index = tree.query_nearest(np.asarray(points, dtype=object), all_matches=False)
+    line_ids = np.empty(len(points), dtype=int)
+    line_ids[index[0]] = index[1]
+    return line_ids
+
+
+def block_key(line_id, side):
+    """Returns the group of a street block side. Road ids are shifted by one,
+      so both sides of road 0 are kept apart.
+    """
+    return (line_id + 1) * side
+
+
+def group_by_block(df, osm, bulk=True):
     """Groups all points in `df` by their street block, separating left and
-      right side. Group membership is indicated in column `GROUP`.
+      right side. Group membership is indicated in column `GROUP`. If `bulk`
+      is True, all points are assigned at once.
     """
     if df.geom_type.nunique() != 1 or df.geom_type.unique()[0] != 'Point':
         raise ValueError('All geometries are expected to be of type Point.')
+    if bulk:
+        line_ids = nearest_line_ids(df.geometry, osm)
+        df.loc[:, GROUP] = block_key(line_ids, osm.metrics().sides(df.geometry, line_ids))
+        df.loc[:, ROAD] = line_ids
+        return df
     df.loc[:, GROUP] = None
+    df.loc[:, ROAD] = None
     for i, row in df.iterrows():
         line_id = get_nearest_line_id(row['geometry'], osm, _LINE_TO_POINTS_INTERVAL)
-        df.loc[i, GROUP] = line_id * utils.side(row['geometry'], osm.get_id(line_id))
+        df.loc[i, GROUP] = block_key(line_id, osm.metrics()[line_id].side(row['geometry']))
+        df.loc[i, ROAD] = line_id
     return df
 
 
@@ -115,119 +267,227 @@ def group_by_locationId(df, locationId):
     return df
 
 
-def group_by_distance(df, max_distance):
+def group_road(df, osm):
+    """Returns the road line all points in `df` were assigned to, if known."""
+    if osm is None or ROAD not in df.columns:
+        return None
+    return osm.get_id(df[ROAD].iloc[0])
+
+
+def split_by_distance(df, max_distance, line=None):
+    """Returns a label for every point in `df`, starting a new label wherever
+      two consecutive points of the TSP path are further away than
+      `max_distance` meters. Labels count up from 0.
+    """
+    labels = np.zeros(len(df), dtype=int)
+    if len(df) > 1:
+        K = solve_tsp(df, line)
+        d = geodesic.path_lengths(geodesic.to_xy(df.geometry)[K])
+        labels[K] = np.concatenate([[0], np.cumsum(d > max_distance)])
+    return labels
+
+
+def _split_group(group, osm, max_distance):
+    return split_by_distance(group, max_distance, group_road(group, osm))
+
+
+def group_by_distance(df, max_distance, osm=None, workers=1):
     """For an existing grouping, separates points which are further away than
-      `max_distance` meters.
+      `max_distance` meters. If `osm` is given, large groups are ordered along
+      their road. Groups are processed by `workers` processes.
     """
+    groups = [group for _, group in df.groupby(GROUP, sort=False)]
+    profiling.record_sizes('block_group_size', map(len, groups))
+    labels = parallel.map_groups(_split_group, groups, workers, osm, max_distance=max_distance)
     group_id = 0
-    for _, group in df.groupby(GROUP, sort=False):
-        group_id += 1
-        if len(group) == 1:
-            df.loc[group.index[0], GROUP] = group_id
-        else:
-            K = solve_tsp(group)
-            for i1, i2 in zip(K, K[1:]):
-                df.loc[group.index[i1], GROUP] = group_id
-                if utils.distance(group.iloc[i1]['geometry'], group.iloc[i2]['geometry']) > max_distance:
-                    group_id += 1
-                df.loc[group.index[i2], GROUP] = group_id
+    for group, group_labels in zip(groups, labels):
+        df.loc[group.index, GROUP] = group_id + 1 + group_labels
+        group_id += 1 + group_labels.max()
     return df
 
 
-def subline(line, d1, d2, min_length, clipping):
+@profiling.timed
+def subline(line, d1, d2, min_length, clipping, road=None):
     """Returns a subline of `line` between `d1` and `d2` which has a given
       minimum length. In case (d2-d1) is smaller than the minimum length, the
       subline will be extended. The subline is guaranteed to have a buffer of
-      `clipping` from the start and end of `line`.
+      `clipping` from the start and end of `line`. `road` is the `Road` of
+      `line` in a `RoadMetrics` table, if already known.
     """
-    sub_line = utils.substring(line, d1, d2)
-    sub_line_length = utils.line_length(sub_line)
+    if road is None:
+        road = road_metrics.RoadMetrics([line])[0]
+    sub_line_length = road.geodesic_length(d1, d2)
     if sub_line_length >= min_length:
-        return sub_line
+        return road.substring(d1, d2)
     else:
-        line_length_deg = line.length / utils.line_length(line)
+        line_length_deg = road.planar_length / road.length
         diff = min_length - sub_line_length
         diff_deg = line_length_deg * diff
         clipping_deg = line_length_deg * clipping
-        res1 = max(0, d2 + diff_deg/2. - line.length)
+        res1 = max(0, d2 + diff_deg/2. - road.planar_length)
         res2 = max(0, diff_deg/2. - d1)
-        return utils.substring(line, max(clipping_deg, d1 - diff_deg/2. - res1), \
-                                     min(line.length-clipping_deg, d2 + diff_deg/2. + res2))
+        return road.substring(max(clipping_deg, d1 - diff_deg/2. - res1), \
+                              min(road.planar_length-clipping_deg, d2 + diff_deg/2. + res2))
 
 
-def points_to_line(df):
+def points_to_line(df, line=None):
     """Transforms all points in `df` into a line."""
-    return LineString([df.iloc[i]['geometry'] for i in solve_tsp(df)]).simplify(0)
+    return LineString([df.iloc[i]['geometry'] for i in solve_tsp(df, line)]).simplify(0)
 
 
-def to_road_line(df, osm, min_length, clipping):
+def to_road_line(df, osm, min_length, clipping, score='sum'):
     """Transforms all points in `df` into a line by translating the closest
-      sub-line in `osm`.
+      sub-line in `osm`, matched by `score`.
     """
-    line_approx = points_to_line(df) if len(df) > 1 else df.iloc[0]['geometry']
-    nearest_road = get_nearest_line(line_approx, osm, _LINE_TO_POINTS_INTERVAL)
-    d = [utils.distance(nearest_road, p) for p in df.geometry]
+    line_approx = points_to_line(df, group_road(df, osm)) if len(df) > 1 else df.iloc[0]['geometry']
+    road = osm.metrics()[get_nearest_line_id(line_approx, osm, _LINE_TO_POINTS_INTERVAL, score)]
+    nearest_road = road.line
+    d = utils.distances(df.geometry, nearest_road)
     d1 = nearest_road.project(Point(line_approx.coords[0]))
     d2 = nearest_road.project(Point(line_approx.coords[-1]))
     d1, d2 = min(d1, d2), max(d1, d2)
-    sub_road = subline(nearest_road, d1, d2, min_length, clipping)
+    sub_road = subline(nearest_road, d1, d2, min_length, clipping, road)
     m1 = line_approx.interpolate(0.5, normalized=True) if len(df) > 1 else line_approx
     m2 = sub_road.interpolate(sub_road.project(m1))
     return utils.translate(sub_road, m1.x-m2.x, m1.y-m2.y).simplify(0), d
 
 
-def to_linestring(df, osm, locationId, min_length, clipping, stats=True, child_id=None):
-    """Converts all groups of points to a LineString."""
+def _group_to_linestring(group, osm, locationId, min_length, clipping, child_id, score):
+    line, d = to_road_line(group, osm, min_length, clipping, score)
+    ids = merge_values(group, child_id) if child_id else None
+    return line, merge_values(group, locationId), ids, d
+
+
+def to_linestring(df, osm, locationId, min_length, clipping, stats=True, child_id=None, workers=1,
+                  score='sum'):
+    """Converts all groups of points to a LineString. Groups are processed by
+      `workers` processes, `score` is the road matching score.
+    """
     if df.geom_type.nunique() != 1 or df.geom_type.unique()[0] != 'Point':
         raise ValueError('All geometries are expected to be of type Point.')
-    dataframe = {'geometry': [], locationId: []}
+    groups = [group for _, group in df.groupby(GROUP, sort=False)]
+    profiling.record_sizes('line_group_size', map(len, groups))
+    results = parallel.map_groups(_group_to_linestring, groups, workers, osm,
+                                  locationId=locationId, min_length=min_length,
+                                  clipping=clipping, child_id=child_id, score=score)
+    n = len(groups)
+    dataframe = {'geometry': np.empty(n, dtype=object), locationId: np.empty(n, dtype=object)}
     if child_id:
-        dataframe[AGG_IDS] = []
+        dataframe[AGG_IDS] = np.empty(n, dtype=object)
     if stats:
-        dataframe[AGG_COUNT], dataframe[AGG_DIST_MIN], dataframe[AGG_DIST_MAX], dataframe[AGG_DIST_AVG] = [], [], [], []
-    agg_count, agg_dist_min, agg_dist_max, agg_dist_avg, agg_ids = [], [], [], [], []
-    for _, group in df.groupby(GROUP, sort=False):
-        line, d = to_road_line(group, osm, min_length, clipping)
-        dataframe['geometry'].append(line)
-        dataframe[locationId].append(merge_values(group, locationId))
+        dataframe[AGG_COUNT] = np.empty(n, dtype=int)
+        for column in (AGG_DIST_MIN, AGG_DIST_MAX, AGG_DIST_AVG):
+            dataframe[column] = np.empty(n, dtype=float)
+    for k, (line, location, ids, d) in enumerate(results):
+        dataframe['geometry'][k] = line
+        dataframe[locationId][k] = location
         if child_id:
-            dataframe[AGG_IDS].append(merge_values(group, child_id))
+            dataframe[AGG_IDS][k] = ids
         if stats:
-            dataframe[AGG_COUNT].append(len(d))
-            dataframe[AGG_DIST_MIN].append(min(d))
-            dataframe[AGG_DIST_MAX].append(max(d))
-            dataframe[AGG_DIST_AVG].append(np.mean(d))
-    return gpd.GeoDataFrame(dataframe)
+            dataframe[AGG_COUNT][k] = len(d)
+            dataframe[AGG_DIST_MIN][k] = d.min()
+            dataframe[AGG_DIST_MAX][k] = d.max()
+            dataframe[AGG_DIST_AVG][k] = d.mean()
+    return gpd.GeoDataFrame(dataframe, crs=df.crs)
 
 
 def split(line1, line2, threshold):
     """Splits `line1` based on `line2` and returns longest substring.
        If all substrings are shorter than `threshold`, line1 is returned."""
-    splits = utils.split(line1, line2)
+    try:
+        splits = list(utils.split(line1, line2).geoms)
+    except ValueError:
+        # Collinear overlaps cannot be split at points, hence are cut out
+        splits = list(shapely.get_parts(line1.difference(line2)))
+    if len(splits) == 0:
+        return line1
     if len(splits) == 1:
         return splits[0]
-    lengths = map(utils.line_length, splits)
+    lengths = list(map(utils.line_length, splits))
     return line1 if max(lengths) < threshold else splits[np.argmax(lengths)]
 
 
-def remove_intersections(df, min_length):
+def _split_intersecting(item, _, min_length):
+    line, others = item
+    return split(line, MultiLineString(list(others)), min_length)
+
+
+def remove_intersections(df, min_length, workers=1):
     """If there are intersections between lines in `df`, removes the smaller
-      part if the larger part is longer than `min_length`.
+      part if the larger part is longer than `min_length`. Every line is split
+      by the original lines it intersects, so the result does not depend on
+      the order of `df`. Lines are processed by `workers` processes.
     """
     if df.geom_type.nunique() != 1 or df.geom_type.unique()[0] != 'LineString':
         raise ValueError('All geometries are expected to be of type LineString.')
-    rtree = RTree(df)
-    for i, row in df.iterrows():
-        ids = rtree.intersection(row['geometry'].bounds)
-        ids.remove(i)
-        if len(ids) > 0:
-            df.loc[i, 'geometry'] = split(row['geometry'],
-                                          MultiLineString(list(df.loc[ids, 'geometry'])),
-                                          min_length)
+    geoms = np.asarray(df.geometry)
+    i, j = shapely.STRtree(geoms).query(geoms, predicate='intersects')
+    order = np.lexsort((j, i))
+    i, j = i[order], j[order]
+    i, j = i[i != j], j[i != j]
+    if len(i) == 0:
+        return df
+    rows, starts = np.unique(i, return_index=True)
+    items = [(geoms[r], geoms[k]) for r, k in zip(rows, np.split(j, starts[1:]))]
+    geoms = geoms.copy()
+    geoms[rows] = parallel.map_groups(_split_intersecting, items, workers, min_length=min_length)
+    df['geometry'] = gpd.GeoSeries(geoms, index=df.index, crs=df.crs)
     return df
 
 
+def prepare(df, *columns, tolerance=None):
+    """Converts `df` to single geometries with string `columns` and merges
+      identical geometries.
+    """
+    df = utils.to_single_geometry(df)
+    df = to_string(df, *columns)
+    return merge_identical_geometries(df, *columns, tolerance=tolerance)
+
+
+def to_projected(df_points, osm):
+    """Returns `df_points` and `osm` in a local metric CRS and the transformer
+      back to lon/lat. The CRS is centered on the road network, so all point
+      layers share the projected network cached by `osm`.
+    """
+    crs = projection.local_crs(osm.bbox)
+    geoms = projection.transform(df_points.geometry, projection.transformer(projection.WGS84, crs))
+    df_points = df_points.set_geometry(gpd.GeoSeries(geoms, index=df_points.index, crs=crs))
+    return df_points, osm.projected(crs), projection.transformer(crs, projection.WGS84)
+
+
+def linestringnize(df_points, osm, location_id, child_id, max_distance, min_length, clipping,
+                   stats=True, workers=1, projected=False, score='sum'):
+    """Runs all pipeline stages on `df_points` and returns the LineStrings.
+      If `projected` is True, points and roads are projected to a local
+      metric CRS once and all stages use planar distances. `score` is the
+      road matching score, one of SCORES.
+    """
+    if projected:
+        crs = df_points.crs
+        with profiling.stage('project'):
+            df_points, osm, back = to_projected(df_points, osm)
+        with geodesic.using(geodesic.PLANAR):
+            df_lines = linestringnize(df_points, osm, location_id, child_id, max_distance, min_length,
+                                      clipping, stats, workers, score=score)
+        geoms = projection.transform(df_lines.geometry, back)
+        return df_lines.set_geometry(gpd.GeoSeries(geoms, index=df_lines.index, crs=crs))
+    with profiling.stage('group_by_block'):
+        df_points = group_by_block(df_points, osm)
+    with profiling.stage('group_by_distance'):
+        df_points = group_by_distance(df_points, max_distance, osm, workers)
+    with profiling.stage('to_linestring'):
+        df_lines = to_linestring(df_points, osm, location_id, min_length, clipping, stats, child_id, workers,
+                                 score)
+    with profiling.stage('remove_intersections'):
+        return remove_intersections(df_lines, 0, workers)
+
+
 if __name__ == '__main__':
+    # Imported here, as these modules import this one
+    import api
+    import streaming
+    import writers
+
     parser = argparse.ArgumentParser()
     parser.add_argument('--input', '-i', required=True, type=str,
                         help='path to the input file')
@@ -251,23 +511,93 @@ if __name__ == '__main__':
     parser.add_argument('--stats', '-s', required=False, type=bool,
                         default=True,
                         help='if true, output file contains statistics on the aggregations')
+    parser.add_argument('--merge_tolerance', '-mT', required=False, type=float,
+                        default=None,
+                        help='if set, points within this distance in meters of each other are merged')
+    parser.add_argument('--score', required=False, type=str,
+                        default='sum', choices=SCORES,
+                        help='score matching a group of points to a road, see SCORES')
+    parser.add_argument('--projected', required=False, action='store_true',
+                        help='if set, points and roads are projected to a local metric CRS and distances are planar')
+    parser.add_argument('--distance_tolerance', '-dT', required=False, type=float,
+                        default=None,
+                        help='if set, distances are approximated locally with this maximum error in meters')
+    parser.add_argument('--precision', required=False, type=int,
+                        default=None,
+                        help='if set, output coordinates are rounded to this number of decimals')
+    parser.add_argument('--workers', '-w', required=False, type=int,
+                        default=1,
+                        help='number of worker processes, 0 uses all CPUs')
+    parser.add_argument('--osm_file', required=False, type=str,
+                        default=None,
+                        help='path to a local .osm or .osm.pbf extract used instead of Overpass')
+    parser.add_argument('--tile_size', '-t', required=False, type=float,
+                        default=None,
+                        help='if set, points are processed in square tiles of this size in meters')
+    parser.add_argument('--halo', '-H', required=False, type=float,
+                        default=streaming.DEFAULT_HALO,
+                        help='overlap in meters around each tile used to complete block groups')
+    parser.add_argument('--previous', '-P', required=False, type=str,
+                        default=None,
+                        help='path to a previous output, only lines affected by --diff are recomputed')
+    parser.add_argument('--diff', '-d', required=False, type=str,
+                        default=None,
+                        help='path to a file listing the IDs of added, removed or moved points')
+    parser.add_argument('--profile', '-p', required=False, type=str,
+                        default=None,
+                        help='path to a JSON report of stage timings, call counts and group sizes')
+    parser.add_argument('--cprofile', required=False, type=str,
+                        default=None,
+                        help='path to a cProfile dump of the whole run')
+    parser.add_argument('--tracemalloc', required=False, action='store_true',
+                        help='if set, the profile report contains the peak memory of every stage')
     args = parser.parse_args()
-    df = utils.load_file(args.input)
-    df = utils.to_single_geometry(df)
-    if args.id:
-        ids = [args.location_id, args.id]
+    if bool(args.previous) != bool(args.diff):
+        parser.error('--previous and --diff have to be given together.')
+    if args.previous and args.tile_size:
+        parser.error('--previous cannot be combined with --tile_size.')
+    if args.projected and (args.tile_size or args.previous):
+        parser.error('--projected cannot be combined with --tile_size or --previous.')
+    if args.distance_tolerance is not None:
+        geodesic.configure(geodesic.LOCAL, args.distance_tolerance)
+    if args.profile:
+        profiling.enable(args.tracemalloc)
+    if args.cprofile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    if args.tile_size:
+        ids = [c for c in (args.location_id, args.id) if c]
+        with profiling.stage('load_file'):
+            df_points, df_other = streaming.load_file(args.input, ids)
+        with profiling.stage('merge_identical_geometries'):
+            df_points = prepare(df_points, *ids, tolerance=args.merge_tolerance)
+            df_other = prepare(df_other, *ids, tolerance=args.merge_tolerance)
+        with writers.open_writer(args.output, args.precision) as writer:
+            writer.reserve(df_other)
+            for df_lines in streaming.process_tiles(df_points, args.tile_size, args.halo,
+                                                    args.location_id, args.id, args.max_distance,
+                                                    args.min_length, args.clipping, args.stats,
+                                                    args.workers, args.score, osm_file=args.osm_file):
+                writer.write(df_lines)
+            writer.write(df_other)
     else:
-        ids = [args.location_id]
-    df = to_string(df, *ids)
-    df = merge_identical_geometries(df, *ids)
-    df_points, df_other = utils.filter_geometry(df, 'Point')
-    df_points_bbox = df_points.total_bounds
-    df_points_bbox_extended = utils.shift(df_points_bbox[0], df_points_bbox[1], 225, _EXTEND_BBOX) \
-                            + utils.shift(df_points_bbox[2], df_points_bbox[3], 45, _EXTEND_BBOX)
-    osm = OSM(df_points_bbox_extended)
-    df_points = group_by_block(df_points, osm)
-    df_points = group_by_distance(df_points, args.max_distance)
-    df_lines = to_linestring(df_points, osm, args.location_id, args.min_length, args.clipping, args.stats, args.id)
-    df_lines = remove_intersections(df_lines, 0)
-    df_final = utils.concat_dfs(df_lines, df_other)
-    utils.save_file(df_final, args.output)
+        with profiling.stage('load_file'):
+            df = utils.load_file(args.input)
+        linestringnizer = api.Linestringnizer(location_id=args.location_id, child_id=args.id,
+                                              max_distance=args.max_distance, min_length=args.min_length,
+                                              clipping=args.clipping, stats=args.stats, workers=args.workers,
+                                              projected=args.projected, score=args.score,
+                                              merge_tolerance=args.merge_tolerance,
+                                              osm_file=args.osm_file)
+        if args.previous:
+            changed = utils.load_ids(args.diff, args.id)
+            df_final = linestringnizer.update(utils.load_file(args.previous), df, changed)
+        else:
+            df_final = linestringnizer.run(df)
+        with profiling.stage('save_file'):
+            utils.save_file(df_final, args.output, args.precision)
+    if args.cprofile:
+        profiler.disable()
+        profiler.dump_stats(args.cprofile)
+    if args.profile:
+        profiling.save(args.profile)
@@ -0,0 +1,186 @@
+"""
+Reads road networks from local OSM extracts (.osm XML or .osm.pbf) instead of
+querying Overpass. Ways are filtered like `query_overpass.build_query` and
+kept in full if any of their segments intersects the requested bounds, as
+Overpass does. The result is returned as compact arrays
+(`osm_to_geojson.Elements`), which `osm_to_geojson` converts directly.
+XML files are read in two streaming passes, the first collects the matching
+ways, the second the coordinates of their nodes, filtered in chunks. They are
+expected to be sorted (nodes before ways), as extracts are. Reading .osm.pbf
+files requires the optional package osmium, which resolves the node
+coordinates of all ways in a single pass.
+"""
+import os
+import array
+import numpy as np
+import shapely
+import xml.etree.ElementTree as ET
+try:
+    import osmium
+except ImportError:
+    osmium = None
+
+from query_overpass import way_matches
+from osm_to_geojson import Elements
+
+
+# Number of nodes filtered at once
+_CHUNK_SIZE = 1 << 20
+
+
+def is_pbf(path):
+    return path.lower().endswith('.pbf')
+
+
+class _Ways:
+    """Collects all ways which match the road filters."""
+    def __init__(self):
+        self.ids, self.refs, self.offsets = array.array('q'), array.array('q'), array.array('q', [0])
+
+    def node(self, id, lon, lat):
+        pass
+
+    def way(self, id, refs, tags):
+        if way_matches(tags):
+            self.ids.append(id)
+            self.refs.extend(refs)
+            self.offsets.append(len(self.refs))
+            return True
+        return False
+
+    def arrays(self):
+        return np.frombuffer(self.ids, dtype=np.int64), np.frombuffer(self.refs, dtype=np.int64), \
+               np.frombuffer(self.offsets, dtype=np.int64)
+
+
+class _Nodes:
+    """Collects the coordinates of the sorted node ids `needed`. Nodes are
+      buffered and filtered `_CHUNK_SIZE` at a time.
+    """
+    def __init__(self, needed):
+        self.needed = needed
+        self.ids, self.coords = [], []
+        self._clear()
+
+    def _clear(self):
+        self.buffer = array.array('q'), array.array('d'), array.array('d')
+
+    def node(self, id, lon, lat):
+        ids, lons, lats = self.buffer
+        ids.append(id)
+        lons.append(lon)
+        lats.append(lat)
+        if len(ids) >= _CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        ids, lons, lats = self.buffer
+        ids = np.frombuffer(ids, dtype=np.int64)
+        if len(ids) and len(self.needed):
+            found = self.needed[np.searchsorted(self.needed, ids).clip(max=len(self.needed) - 1)] == ids
+            self.ids.append(ids[found])
+            self.coords.append(np.column_stack([np.frombuffer(lons), np.frombuffer(lats)])[found])
+        self._clear()
+
+    def arrays(self):
+        self.flush()
+        if not self.ids:
+            return np.array([], dtype=np.int64), np.empty((0, 2))
+        return np.concatenate(self.ids), np.concatenate(self.coords)
+
+
+def _read_xml(path, handler, ways=True):
+    """Calls `handler.node` and, if `ways` is True, `handler.way` for all
+      elements in an OSM XML file.
+    """
+    context = ET.iterparse(path, events=('start', 'end'))
+    _, root = next(context)
+    for event, elem in context:
+        if event != 'end':
+            continue
+        if elem.tag == 'node':
+            handler.node(int(elem.get('id')), float(elem.get('lon')), float(elem.get('lat')))
+        elif elem.tag == 'way':
+            if not ways:
+                break
+            handler.way(int(elem.get('id')), [int(nd.get('ref')) for nd in elem.iter('nd')],
+                        {tag.get('k'): tag.get('v') for tag in elem.iter('tag')})
+        elif elem.tag != 'relation':
+            continue
+        root.clear()
+
+
+def _read_pbf(path):
+    """Returns the `Elements` of all matching ways in an OSM PBF file."""
+    if osmium is None:
+        raise ValueError('Reading %s requires the package osmium.' % path)
+    ways, lons, lats = _Ways(), array.array('d'), array.array('d')
+
+    class Handler(osmium.SimpleHandler):
+        def way(self, w):
+            if ways.way(w.id, [n.ref for n in w.nodes], {t.k: t.v for t in w.tags}):
+                if not all(n.location.valid() for n in w.nodes):
+                    raise ValueError('OSM file %s misses nodes referenced by ways.' % path)
+                lons.extend(n.lon for n in w.nodes)
+                lats.extend(n.lat for n in w.nodes)
+
+    Handler().apply_file(path, locations=True)
+    way_ids, refs, offsets = ways.arrays()
+    return Elements.from_arrays(refs, np.column_stack([np.frombuffer(lons), np.frombuffer(lats)]),
+                                way_ids, refs, offsets)
+
+
+def _read(path):
+    """Returns the `Elements` of all matching ways in an OSM file."""
+    if is_pbf(path):
+        return _read_pbf(path)
+    ways = _Ways()
+    _read_xml(path, ways)
+    way_ids, refs, offsets = ways.arrays()
+    nodes = _Nodes(np.unique(refs))
+    _read_xml(path, nodes, ways=False)
+    ids, coords = nodes.arrays()
+    if len(np.unique(ids)) < len(nodes.needed):
+        raise ValueError('OSM file %s misses nodes referenced by ways.' % path)
+    return Elements.from_arrays(ids, coords, way_ids, refs, offsets)
+
+
+def select(elements, bounds):
+    """Returns the ways of `elements` with a segment intersecting `bounds`,
+      in full, and their nodes. Ways of a single node are dropped.
+    """
+    lengths = np.diff(elements.offsets)
+    xy = elements.coords[np.searchsorted(elements.ids, elements.refs)]
+    # Bounding boxes of the ways, longer ways only extend them
+    candidates = np.flatnonzero(lengths >= 2)
+    starts = elements.offsets[candidates]
+    keep = np.zeros(len(lengths), dtype=bool)
+    if len(candidates):
+        low, high = np.minimum.reduceat(xy, starts), np.maximum.reduceat(xy, starts)
+        overlap = (low[:, 0] <= bounds[2]) & (high[:, 0] >= bounds[0]) & \
+                  (low[:, 1] <= bounds[3]) & (high[:, 1] >= bounds[1])
+        candidates = candidates[overlap]
+        mask = np.zeros(len(lengths), dtype=bool)
+        mask[candidates] = True
+        lines = shapely.linestrings(xy[np.repeat(mask, lengths)],
+                                    indices=np.repeat(np.arange(len(candidates)), lengths[candidates]))
+        keep[candidates[shapely.intersects(lines, shapely.box(*bounds))]] = True
+    refs = elements.refs[np.repeat(keep, lengths)]
+    ids = np.unique(refs)
+    return Elements.from_arrays(ids, elements.coords[np.searchsorted(elements.ids, ids)],
+                                elements.way_ids[keep], refs, np.concatenate([[0], np.cumsum(lengths[keep])]))
+
+
+def read_roads(path, bounds=None):
+    """Returns all matching roads intersecting `bounds` and their nodes.
+      Arguments:
+        path: String. Path to an .osm or .osm.pbf file.
+        bounds: Tuple or None. (minx, miny, maxx, maxy) in degrees. If None,
+          all roads are returned.
+      Returns:
+        An `osm_to_geojson.Elements` object.
+    """
+    if not os.path.exists(path):
+        raise ValueError('OSM file %s does not exist.' % path)
+    elements = _read(path)
+    return elements if bounds is None else select(elements, bounds)
@@ -1,10 +1,97 @@
-from spatial_search import RTree
-from query_overpass import query_overpass
+import os
+import pyproj
+import shapely
+import geopandas as gpd
+
+import projection
+import profiling
+import road_cache
+import road_metrics
+from spatial_search import SpatialIndex
+from query_overpass import query_overpass, snap_bounds, DEFAULT_TILE_SIZE
 from osm_to_geojson import osm_to_geojson
+from osm_file import read_roads
+
+
+class OSM(SpatialIndex):
+    _local = None
+    _metrics = None
+    # Projected copies of the network by CRS
+    _projected = None
+    # Projected CRS of the lines, None for lon/lat
+    crs = None
+
+    def __init__(self, bbox, NUM_KNN=10, cache=road_cache.PATH_CACHE, tile_size=DEFAULT_TILE_SIZE,
+                 osm_file=None):
+        if tile_size:
+            bbox = snap_bounds(bbox, tile_size)
+        self.bbox = tuple(bbox)
+        if osm_file:
+            # A changed extract invalidates cached networks
+            key = road_cache.make_key(bbox, source=os.path.abspath(osm_file),
+                                      mtime=os.path.getmtime(osm_file))
+        else:
+            key = road_cache.make_key(bbox)
+        df = road_cache.load(key, cache)
+        if df is None:
+            with profiling.stage('fetch_roads'):
+                if osm_file:
+                    osm_data = read_roads(osm_file, bbox)
+                else:
+                    osm_data = query_overpass(bbox, tile_size=tile_size)
+            with profiling.stage('osm_to_geojson'):
+                df = osm_to_geojson(osm_data)
+            road_cache.save(df, key, cache)
+        SpatialIndex.__init__(self, df, NUM_KNN)
+
+    @classmethod
+    def from_dataframe(cls, df, NUM_KNN=10):
+        """Returns an OSM object of the road lines in `df`, e.g. as returned by
+          `osm_to_geojson`.
+        """
+        osm = cls.__new__(cls)
+        osm.bbox = tuple(df.total_bounds)
+        SpatialIndex.__init__(osm, df, NUM_KNN)
+        return osm
+
+    def __getstate__(self):
+        return dict(SpatialIndex.__getstate__(self), bbox=self.bbox, crs=self.crs)
+
+    def __setstate__(self, state):
+        SpatialIndex.__setstate__(self, state)
+        self.bbox = state['bbox']
+        self.crs = state['crs']
+
+    def projected(self, crs):
+        """Returns a copy of the road network with all lines in the metric
+          `crs`. `bbox` stays in lon/lat. The copy is built once per CRS.
+        """
+        if self._projected is None:
+            self._projected = {}
+        key = pyproj.CRS(crs).to_wkt()
+        if key not in self._projected:
+            lines = projection.transform(self.geoms, projection.transformer(projection.WGS84, crs))
+            osm = OSM.from_dataframe(gpd.GeoDataFrame(geometry=lines, crs=crs), self.NUM_KNN)
+            osm.bbox, osm.crs = self.bbox, crs
+            self._projected[key] = osm
+        return self._projected[key]
 
+    def local_index(self):
+        """Returns a transformer to a local metric CRS, the projected lines
+          and an STRtree over them. Built on first use. The transformer is
+          None if the lines are projected already.
+        """
+        if self._local is None and self.crs is not None:
+            self._local = None, self.geoms, shapely.STRtree(self.geoms)
+        elif self._local is None:
+            transformer = projection.transformer(projection.WGS84,
+                                                 projection.local_crs(self.df.total_bounds))
+            lines = projection.transform(self.df.geometry, transformer)
+            self._local = transformer, lines, shapely.STRtree(lines)
+        return self._local
 
-class OSM(RTree):
-    def __init__(self, bbox, NUM_KNN=10):
-        osm_data = query_overpass(bbox)
-        df = osm_to_geojson(osm_data)
-        RTree.__init__(self, df, NUM_KNN)
+    def metrics(self):
+        """Returns the `RoadMetrics` table of all lines. Built on first use."""
+        if self._metrics is None:
+            self._metrics = road_metrics.RoadMetrics(self.geoms)
+        return self._metrics
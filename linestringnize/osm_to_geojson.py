@@ -1,11 +1,18 @@
 import json
+import array
+import shapely
 import shapely.ops
 import numpy as np
 import geopandas as gpd
 from shapely.geometry import Point, MultiPoint, LineString, MultiLineString, Polygon, MultiPolygon, GeometryCollection
 
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
 from split import split
-from spatial_search import RTree
+from spatial_search import SpatialIndex
 
 
 def to_single(geom):
@@ -20,11 +27,11 @@ def to_single(geom):
     if type(geom) in (Point, LineString, Polygon):
         return [geom]
     if type(geom) in (MultiPoint, MultiLineString, MultiPolygon):
-        return [x for x in geom]
+        return list(geom.geoms)
     if geom.is_empty:
         return [geom]
     else:
-        return [y for x in geom for y in to_single(x)]
+        return [y for x in geom.geoms for y in to_single(x)]
 
 
 def get_intersections(lines):
@@ -39,12 +46,10 @@ def get_intersections(lines):
     if isinstance(lines, MultiLineString):
         lines = to_single(lines)
     intersections = []
-    df = gpd.GeoDataFrame(geometry=lines)
-    rtree = RTree(df)
-    for i, row in df.iterrows():
-        ids = rtree.intersection(row['geometry'].bounds)
-        ids.remove(i)
-        inter = row['geometry'].intersection(MultiLineString(list(rtree.get_id(ids))))
+    spatial_index = SpatialIndex(gpd.GeoDataFrame(geometry=lines))
+    for i, ids in enumerate(spatial_index.intersection_many(spatial_index.bounds)):
+        ids = ids[ids != i]
+        inter = lines[i].intersection(MultiLineString(list(spatial_index.get_id(ids))))
         if not inter.is_empty:
             intersections += to_single(inter)
     # Makes sure that only Points are returned
@@ -52,25 +57,153 @@ def get_intersections(lines):
     return MultiPoint(intersections)
 
 
-def osm_to_geojson(data):
+def split_ways(refs, offsets):
+    """Splits OSM ways into block-wise sequences of node ids. Ways are merged
+      at nodes connecting exactly two road segments and split at all other
+      nodes, i.e. dead ends and intersections (degree >= 3). The road graph
+      is kept in compact arrays of its undirected edges.
+      Arguments:
+        refs: Array. Node ids of all ways, concatenated.
+        offsets: Array. Start of every way in `refs` and the end of the last.
+      Returns:
+        The node ids of all blocks, concatenated, and their offsets.
+    """
+    last = np.zeros(len(refs), dtype=bool)
+    last[np.asarray(offsets[1:], dtype=np.int64) - 1] = True
+    valid = ~last[:-1] & (refs[:-1] != refs[1:])
+    a, b = refs[:-1][valid], refs[1:][valid]
+    nodes, first = np.unique(np.column_stack([a, b]).ravel(), return_index=True)
+    # Nodes are walked in order of their first appearance in the ways
+    appearance = np.argsort(first, kind='stable')
+    a, b = np.searchsorted(nodes, a), np.searchsorted(nodes, b)
+    edges = np.unique(np.minimum(a, b) * len(nodes) + np.maximum(a, b))
+    low, high = edges // max(len(nodes), 1), edges % max(len(nodes), 1)
+    source, target = np.concatenate([low, high]), np.concatenate([high, low])
+    order = np.lexsort((target, source))
+    target = memoryview(np.ascontiguousarray(target[order]))
+    edge = memoryview(np.ascontiguousarray(np.tile(np.arange(len(edges)), 2)[order]))
+    degree = np.bincount(source, minlength=len(nodes))
+    start = memoryview(np.concatenate([[0], np.cumsum(degree)]))
+    degree = memoryview(degree)
+    visited = bytearray(len(edges))
+    sequence, block_offsets = array.array('q'), array.array('q', [0])
+
+    def walk(first, k):
+        previous, node = first, target[k]
+        visited[edge[k]] = 1
+        sequence.extend((first, node))
+        while node != first and degree[node] == 2:
+            k = start[node]
+            if target[k] == previous:
+                k += 1
+            if visited[edge[k]]:
+                break
+            visited[edge[k]] = 1
+            previous, node = node, target[k]
+            sequence.append(node)
+        block_offsets.append(len(sequence))
+
+    # Starts at dead ends and intersections first, then walks remaining loops
+    for junctions in (True, False):
+        for node in appearance.tolist():
+            if (degree[node] != 2) == junctions:
+                for k in range(start[node], start[node + 1]):
+                    if not visited[edge[k]]:
+                        walk(node, k)
+    return nodes[np.frombuffer(sequence, dtype=np.int64)], np.frombuffer(block_offsets, dtype=np.int64)
+
+
+def read_elements(path):
+    """Yields the elements of an OSM JSON file one at a time. Without the
+      optional package ijson, the file is loaded at once.
+    """
+    with open(path, 'rb') as f:
+        if ijson is None:
+            yield from json.load(f)['elements']
+        else:
+            yield from ijson.items(f, 'elements.item', use_float=True)
+
+
+class Elements:
+    """Compact arrays of the nodes and ways of OSM elements. Node ids are
+      sorted, so coordinates are looked up by binary search. Of duplicate
+      nodes and ways, e.g. of overlapping tiles, the first is kept.
+      Arguments:
+        elements: Iterable of dicts in Overpass JSON format.
+    """
+    def __init__(self, elements):
+        ids, lon, lat = array.array('q'), array.array('d'), array.array('d')
+        way_ids, refs, offsets = array.array('q'), array.array('q'), array.array('q', [0])
+        for obj in elements:
+            if obj['type'] == 'node':
+                ids.append(obj['id'])
+                lon.append(obj['lon'])
+                lat.append(obj['lat'])
+            elif obj['type'] == 'way':
+                way_ids.append(obj['id'])
+                refs.extend(obj['nodes'])
+                offsets.append(len(refs))
+        self._index(np.frombuffer(ids, dtype=np.int64),
+                    np.column_stack([np.frombuffer(lon), np.frombuffer(lat)]),
+                    np.frombuffer(way_ids, dtype=np.int64), np.frombuffer(refs, dtype=np.int64),
+                    np.frombuffer(offsets, dtype=np.int64))
+
+    @classmethod
+    def from_arrays(cls, ids, coords, way_ids, refs, offsets):
+        """Returns the Elements of nodes `ids` at `coords` and of ways
+          `way_ids` whose node ids are concatenated in `refs` at `offsets`.
+        """
+        elements = cls.__new__(cls)
+        elements._index(ids, coords, way_ids, refs, offsets)
+        return elements
+
+    def _index(self, ids, coords, way_ids, refs, offsets):
+        self.ids, first = np.unique(ids, return_index=True)
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 2)[first]
+        keep = np.zeros(len(way_ids), dtype=bool)
+        keep[np.unique(way_ids, return_index=True)[1]] = True
+        lengths = np.diff(offsets)
+        self.way_ids = way_ids[keep]
+        self.refs = refs[np.repeat(keep, lengths)]
+        self.offsets = np.concatenate([[0], np.cumsum(lengths[keep])]).astype(np.int64)
+
+    def linestrings(self, refs, offsets):
+        """Returns an array of LineStrings from node ids concatenated in `refs`
+          at `offsets`, built in bulk.
+        """
+        i = np.searchsorted(self.ids, refs).clip(max=max(len(self.ids) - 1, 0))
+        if len(refs) and (len(self.ids) == 0 or np.any(self.ids[i] != refs)):
+            raise ValueError('OSM data misses nodes referenced by ways.')
+        index = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+        return shapely.linestrings(self.coords[i], indices=index) if len(refs) else np.array([], dtype=object)
+
+
+def osm_to_geojson(data, method='graph'):
     """Takes OSM data as input and converts it to a GeoDataFrame.
       Arguments:
-        data: Dict or String. The OSM data in JSON format. If String, a JSON
-          file at this path is tried to be openend.
+        data: Dict, String or Elements. The OSM data in JSON format, whose
+          elements may be any iterable. If String, a JSON file at this path
+          is read element by element.
+        method: String. Either 'graph', which splits the ways at shared nodes
+          of the road graph, or 'geometric', which splits the merged lines at
+          all their intersections.
       Returns:
         df: GeoDataFrame. Contains all block-wise lines found in `data`.
     """
     if isinstance(data, str):
-        data = json.load(open(data, 'r'))
-    if not isinstance(data, dict):
+        elements = Elements(read_elements(data))
+    elif isinstance(data, dict):
+        elements = Elements(data['elements'])
+    elif isinstance(data, Elements):
+        elements = data
+    else:
         raise ValueError('Argument `data` is expected to be a dictionary.')
-    nodes, ways = {}, []
-    for obj in data['elements']:
-        if obj['type'] == 'node':
-            nodes[obj['id']] = Point(obj['lon'], obj['lat'])
-        elif obj['type'] == 'way':
-            ways.append(obj['nodes'])
-    lines = [LineString([nodes[x] for x in w]) for w in ways]
+    if method not in ('graph', 'geometric'):
+        raise ValueError('Argument `method` has to be either graph or geometric.')
+    if method == 'graph':
+        lines = shapely.simplify(elements.linestrings(*split_ways(elements.refs, elements.offsets)), 0)
+        return gpd.GeoDataFrame({'geometry': lines})
+    lines = list(elements.linestrings(elements.refs, elements.offsets))
     union = shapely.ops.unary_union(lines)
     merged = shapely.ops.linemerge(union).simplify(0)
     splitted = split(merged, get_intersections(merged))
@@ -0,0 +1,66 @@
+"""
+Applies a function to independent groups of points on a pool of processes.
+A shared read-only object (e.g. the OSM road network) is handed to every
+worker once: inherited through fork where available, pickled otherwise. The
+distance settings of `geodesic` are handed over the same way, and the
+recordings of `profiling` are sent back with the results.
+"""
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import geodesic
+import profiling
+
+
+_SHARED = None
+
+
+def _initializer(shared, config, profile):
+    global _SHARED
+    _SHARED = shared
+    geodesic.configure(**config)
+    # Recordings inherited through fork were made by the main process
+    profiling.reset()
+    if profile:
+        profiling.enable()
+
+
+def _apply(func, group):
+    result = func(group, _SHARED)
+    return result, profiling.collect() if profiling.is_enabled() else None
+
+
+def _context():
+    """Prefers fork, so the shared object does not need to be pickled."""
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context()
+
+
+def num_workers(workers):
+    """Returns the number of worker processes; 0 or None means all CPUs."""
+    return workers if workers else multiprocessing.cpu_count()
+
+
+def map_groups(func, groups, workers=1, shared=None, chunksize=None, **kwargs):
+    """Returns `[func(group, shared, **kwargs) for group in groups]` computed
+      by `workers` processes. The results keep the order of `groups`.
+    """
+    if kwargs:
+        func = functools.partial(func, **kwargs)
+    groups = list(groups)
+    workers = min(num_workers(workers), len(groups))
+    if workers <= 1:
+        return [func(group, shared) for group in groups]
+    if chunksize is None:
+        chunksize = max(1, len(groups) // (4 * workers))
+    initargs = (shared, dict(geodesic._config), profiling.is_enabled())
+    with ProcessPoolExecutor(workers, mp_context=_context(),
+                             initializer=_initializer, initargs=initargs) as executor:
+        results = []
+        for result, recordings in executor.map(functools.partial(_apply, func), groups, chunksize=chunksize):
+            if recordings:
+                profiling.merge(recordings)
+            results.append(result)
+        return results
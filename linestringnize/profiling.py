@@ -0,0 +1,126 @@
+"""
+Optional instrumentation of the pipeline. Records wall time and peak memory
+of stages, wall time and call counts of helper functions, and histograms of
+group sizes. Nothing is recorded unless `enable` was called. Function calls
+and group sizes recorded in worker processes of `parallel` are added to
+those of the main process, so their seconds sum up over all workers.
+"""
+import time
+import json
+import functools
+import contextlib
+import tracemalloc
+from collections import Counter, defaultdict
+try:
+    import resource
+except ImportError: # Not available on Windows
+    resource = None
+
+
+_state = {'enabled': False}
+_stages = defaultdict(lambda: {'calls': 0, 'seconds': 0., 'peak_memory': None})
+_functions = defaultdict(lambda: {'calls': 0, 'seconds': 0.})
+_histograms = defaultdict(Counter)
+
+
+def enable(trace_memory=False):
+    """Starts recording. If `trace_memory` is True, the peak memory of every
+      stage is traced with tracemalloc, which slows down the pipeline.
+    """
+    _state['enabled'] = True
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    _state['enabled'] = False
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def reset():
+    _stages.clear()
+    _functions.clear()
+    _histograms.clear()
+
+
+def is_enabled():
+    return _state['enabled']
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Records wall time and peak memory of a pipeline stage."""
+    if not _state['enabled']:
+        yield
+        return
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record = _stages[name]
+        record['calls'] += 1
+        record['seconds'] += time.perf_counter() - start
+        if tracemalloc.is_tracing():
+            peak = tracemalloc.get_traced_memory()[1]
+            record['peak_memory'] = max(record['peak_memory'] or 0, peak)
+
+
+def timed(func):
+    """Decorator recording wall time and call count of `func`."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not _state['enabled']:
+            return func(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record = _functions[func.__name__]
+            record['calls'] += 1
+            record['seconds'] += time.perf_counter() - start
+    return wrapper
+
+
+def record_sizes(name, sizes):
+    """Adds `sizes` to the histogram `name`, binned by powers of two."""
+    if _state['enabled']:
+        for size in sizes:
+            _histograms[name][1 << (max(int(size), 1) - 1).bit_length()] += 1
+
+
+def collect():
+    """Returns the function and histogram recordings made since the last call
+      and clears them, to hand them from a worker to the main process.
+    """
+    recordings = {'functions': dict(_functions), 'histograms': dict(_histograms)}
+    _functions.clear()
+    _histograms.clear()
+    return recordings
+
+
+def merge(recordings):
+    """Adds `recordings` as returned by `collect` to the current ones."""
+    for name, record in recordings['functions'].items():
+        _functions[name]['calls'] += record['calls']
+        _functions[name]['seconds'] += record['seconds']
+    for name, histogram in recordings['histograms'].items():
+        _histograms[name].update(histogram)
+
+
+def report():
+    """Returns all recordings as a dict."""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+    return {
+        'stages': dict(_stages),
+        'functions': dict(_functions),
+        'histograms': {name: {'<=%d' % b: c for b, c in sorted(h.items())} \
+                       for name, h in _histograms.items()},
+        'max_rss_kb': max_rss,
+    }
+
+
+def save(path):
+    json.dump(report(), open(path, 'w'), indent=2)
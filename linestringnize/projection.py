@@ -0,0 +1,30 @@
+"""
+Local projected coordinate systems for city-scale geometry work.
+"""
+import pyproj
+import numpy as np
+import shapely
+
+
+WGS84 = 'EPSG:4326'
+
+
+def local_crs(bounds):
+    """Returns an azimuthal equidistant CRS (meters) centered on `bounds`."""
+    if not hasattr(bounds, '__getitem__') or len(bounds) != 4:
+        raise ValueError('`bounds` has to be a tuple of exactly 4 numbers.')
+    lon, lat = (bounds[0] + bounds[2]) / 2., (bounds[1] + bounds[3]) / 2.
+    return pyproj.CRS.from_proj4('+proj=aeqd +lat_0={lat} +lon_0={lon} +datum=WGS84 +units=m +no_defs'
+                                 .format(lat=lat, lon=lon))
+
+
+def transformer(crs_from, crs_to):
+    """Returns a Transformer between two CRS with lon/lat axis order."""
+    return pyproj.Transformer.from_crs(crs_from, crs_to, always_xy=True)
+
+
+def transform(geoms, transformer):
+    """Applies `transformer` to all coordinates of `geoms` in one call."""
+    def _transform(xy):
+        return np.column_stack(transformer.transform(xy[:, 0], xy[:, 1]))
+    return shapely.transform(np.asarray(geoms, dtype=object), _transform)
@@ -1,13 +1,23 @@
 import os
 import json
+import time
+import math
+import tempfile
 import requests
 import urllib3
+from concurrent.futures import ThreadPoolExecutor
+
+from osm_to_geojson import read_elements
 urllib3.disable_warnings() # Suppresses InsecureRequestWarning
 
 
 DEFAULT_ENDPOINT = 'https://overpass-api.de/api/interpreter'
 DEFAULT_TIMEOUT = 25
 PATH_CACHE = '.tmp'
+DEFAULT_TILE_SIZE = 0.02 # degrees
+MAX_CONCURRENT_REQUESTS = 2
+MAX_RETRIES = 3
+RETRY_BACKOFF = 2. # seconds
 
 
 ################################################################################
@@ -36,6 +46,17 @@ def overpass_post(query, endpoint, timeout):
     return r.json()
 
 
+def overpass_post_retry(query, endpoint, timeout, retries=MAX_RETRIES):
+    """Calls `overpass_post` and retries with exponential backoff on failure."""
+    for attempt in range(retries + 1):
+        try:
+            return overpass_post(query, endpoint, timeout)
+        except (requests.RequestException, ValueError):
+            if attempt == retries:
+                raise
+            time.sleep(RETRY_BACKOFF * 2**attempt)
+
+
 def build_query(bounds):
     if not hasattr(bounds, '__getitem__') or len(bounds) != 4:
         raise ValueError('`bounds` has to be a tuple of exactly 4 numbers.')
@@ -51,6 +72,14 @@ def build_query(bounds):
     return '[out:json];(' + nodes + ways + ');out body;>;out body qt;'
 
 
+def way_matches(tags):
+    """Returns True if a way with the dict `tags` passes the filters of
+      `build_query`.
+    """
+    return 'highway' in tags and tags['highway'] not in blacklist_highway and \
+           not any(key in tags for key in blacklist_keys)
+
+
 def make_filename(bounds):
     if not hasattr(bounds, '__getitem__') or len(bounds) != 4:
         raise ValueError('`bounds` has to be a tuple of exactly 4 numbers.')
@@ -58,14 +87,84 @@ def make_filename(bounds):
                                                  x2=bounds[2], y2=bounds[3])
 
 
+def get_tiles(bounds, tile_size):
+    """Returns the (column, row) indexes of all grid tiles covering `bounds`."""
+    if not hasattr(bounds, '__getitem__') or len(bounds) != 4:
+        raise ValueError('`bounds` has to be a tuple of exactly 4 numbers.')
+    x1, y1 = math.floor(bounds[0] / tile_size), math.floor(bounds[1] / tile_size)
+    # Upper bounds on a grid line do not reach into the next tile
+    x2 = max(x1, math.ceil(bounds[2] / tile_size - 1e-9) - 1)
+    y2 = max(y1, math.ceil(bounds[3] / tile_size - 1e-9) - 1)
+    return [(x, y) for x in range(x1, x2 + 1) for y in range(y1, y2 + 1)]
+
+
+def tile_bounds(tile, tile_size):
+    """Returns the bounds of a grid tile."""
+    return tuple(round(v * tile_size, 9) for v in (tile[0], tile[1], tile[0] + 1, tile[1] + 1))
+
+
+def snap_bounds(bounds, tile_size):
+    """Returns `bounds` extended to the grid tiles covering it."""
+    tiles = get_tiles(bounds, tile_size)
+    (x1, y1), (x2, y2) = tiles[0], tiles[-1]
+    return tile_bounds((x1, y1), tile_size)[:2] + tile_bounds((x2, y2), tile_size)[2:]
+
+
+def make_tile_filename(tile, tile_size):
+    return 'osm_tile_{size}_{x}_{y}.json'.format(size=tile_size, x=tile[0], y=tile[1])
+
+
+def dump(map, path):
+    """Writes `map` to `path` atomically. The temporary file is unique, as
+      other processes may write the same path.
+    """
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(path), suffix='.part', delete=False) as f:
+        json.dump(map, f)
+    os.replace(f.name, path)
+
+
+def query_tiles(bounds, tile_size, cache=PATH_CACHE,
+                                   endpoint=DEFAULT_ENDPOINT,
+                                   timeout=DEFAULT_TIMEOUT,
+                                   max_workers=MAX_CONCURRENT_REQUESTS):
+    """Queries all grid tiles covering `bounds`. Only tiles missing in `cache`
+      are fetched, at most `max_workers` at a time. The elements of all tiles
+      are read lazily from `cache`. Elements shared by several tiles occur
+      once per tile; `osm_to_geojson.Elements` keeps only the first.
+    """
+    def path(tile):
+        return os.path.join(cache, make_tile_filename(tile, tile_size))
+
+    def fetch(tile):
+        map = overpass_post_retry(build_query(tile_bounds(tile, tile_size)), endpoint, timeout)
+        if not cache:
+            return map
+        dump(map, path(tile))
+
+    tiles = get_tiles(bounds, tile_size)
+    missing = [tile for tile in tiles if not cache or not os.path.exists(path(tile))]
+    with ThreadPoolExecutor(max_workers) as executor:
+        maps = list(executor.map(fetch, missing))
+    if not cache:
+        return {'elements': (obj for map in maps for obj in map['elements'])}
+    return {'elements': (obj for tile in tiles for obj in read_elements(path(tile)))}
+
+
 def query_overpass(bounds, cache=PATH_CACHE,
                            endpoint=DEFAULT_ENDPOINT,
-                           timeout=DEFAULT_TIMEOUT):
-    if cache and not os.path.isdir(cache):
-        os.mkdir(cache)
+                           timeout=DEFAULT_TIMEOUT,
+                           tile_size=DEFAULT_TILE_SIZE):
+    """Returns all OSM nodes and roads within `bounds`. If `tile_size` is set,
+      the area is fetched and cached as grid tiles, which may extend beyond
+      `bounds`, and the elements are a generator over the tiles.
+    """
+    if cache:
+        os.makedirs(cache, exist_ok=True)
+    if tile_size:
+        return query_tiles(bounds, tile_size, cache, endpoint, timeout)
     if cache and os.path.exists(os.path.join(cache, make_filename(bounds))):
         return json.load(open(os.path.join(cache, make_filename(bounds)), 'r'))
     map = overpass_post(build_query(bounds), endpoint, timeout)
     if cache:
-        json.dump(map, open(os.path.join(cache, make_filename(bounds)), 'w'))
+        dump(map, os.path.join(cache, make_filename(bounds)))
     return map
@@ -0,0 +1,81 @@
+"""
+Persistent cache of processed road networks. The block-split lines returned
+by `osm_to_geojson` are stored as WKB arrays keyed by bounding box and
+blacklist configuration, so repeated runs skip both the Overpass request and
+the topology build. The cache is bounded in size; least recently used
+entries are evicted first.
+"""
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+import shapely
+import geopandas as gpd
+
+import query_overpass
+
+
+PATH_CACHE = os.path.join(query_overpass.PATH_CACHE, 'roads')
+MAX_CACHE_SIZE = 1024**3 # bytes
+_VERSION = 3
+
+
+def make_key(bounds, **config):
+    """Returns the cache key of the road network within `bounds`. Additional
+      `config` entries (e.g. a data source) are part of the key.
+    """
+    if not hasattr(bounds, '__getitem__') or len(bounds) != 4:
+        raise ValueError('`bounds` has to be a tuple of exactly 4 numbers.')
+    payload = dict(config,
+                   version=_VERSION,
+                   bounds=[float(b) for b in bounds],
+                   blacklist_highway=query_overpass.blacklist_highway,
+                   blacklist_keys=query_overpass.blacklist_keys)
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def make_filename(key):
+    return 'roads_{key}.npz'.format(key=key)
+
+
+def load(key, cache=PATH_CACHE):
+    """Returns the cached GeoDataFrame for `key` or None."""
+    if not cache:
+        return None
+    path = os.path.join(cache, make_filename(key))
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        wkb, offsets = data['wkb'], data['offsets']
+    os.utime(path) # Marks the entry as recently used
+    geoms = shapely.from_wkb([wkb[a:b].tobytes() for a, b in zip(offsets, offsets[1:])])
+    return gpd.GeoDataFrame({'geometry': geoms})
+
+
+def save(df, key, cache=PATH_CACHE, max_size=MAX_CACHE_SIZE):
+    """Stores the geometries of `df` under `key` and evicts old entries."""
+    if not cache:
+        return
+    os.makedirs(cache, exist_ok=True)
+    wkb = shapely.to_wkb(np.asarray(df.geometry))
+    offsets = np.concatenate([[0], np.cumsum([len(b) for b in wkb])])
+    path = os.path.join(cache, make_filename(key))
+    # A unique temporary file, as other processes may save the same key
+    with tempfile.NamedTemporaryFile(dir=cache, suffix='.part', delete=False) as f:
+        np.savez(f, wkb=np.frombuffer(b''.join(wkb), dtype=np.uint8), offsets=offsets)
+    os.replace(f.name, path)
+    evict(cache, max_size)
+
+
+def evict(cache=PATH_CACHE, max_size=MAX_CACHE_SIZE):
+    """Removes least recently used entries until `cache` fits `max_size`."""
+    entries = [os.path.join(cache, f) for f in os.listdir(cache) \
+               if f.startswith('roads_') and f.endswith('.npz')]
+    entries = sorted(entries, key=os.path.getmtime)
+    total = sum(map(os.path.getsize, entries))
+    for path in entries[:-1]:
+        if total <= max_size:
+            break
+        total -= os.path.getsize(path)
+        os.remove(path)
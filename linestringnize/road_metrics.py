@@ -0,0 +1,121 @@
+"""
+Precomputed metrics of road lines. Vertices of all lines are kept in one
+contiguous array together with the cumulative planar (degrees) and geodesic
+(meters) lengths along each line, so lengths, substrings and sides are
+found by binary search instead of walking the line.
+"""
+import numpy as np
+import shapely
+import shapely.ops
+from shapely.geometry import LineString
+
+import geodesic
+
+
+def _cross(u, v):
+    """Row-wise 2D cross product of `v` and `u`, positive if `u` points to
+      the right of `v`.
+    """
+    return u[:, 0] * v[:, 1] - u[:, 1] * v[:, 0]
+
+
+class RoadMetrics:
+    """Segment table of an array of LineStrings. Geodesic lengths use the
+      distance method configured when the table is built.
+    """
+    def __init__(self, lines):
+        self.lines = np.asarray(lines, dtype=object)
+        self.coords, index = shapely.get_coordinates(self.lines, return_index=True)
+        self.starts = np.searchsorted(index, np.arange(len(self.lines)))
+        self.ends = np.append(self.starts[1:], len(self.coords)) - 1
+        same = index[1:] == index[:-1]
+        segments = np.diff(self.coords, axis=0)
+        planar = np.hypot(segments[:, 0], segments[:, 1]) * same
+        geo = np.where(same, geodesic.path_lengths(self.coords), 0.) if len(self.coords) else planar
+        # Cumulative lengths over all lines, which stay constant between lines
+        self.planar = np.concatenate([[0.], np.cumsum(planar)])
+        self.geodesic = np.concatenate([[0.], np.cumsum(geo)])
+
+    def __len__(self):
+        return len(self.lines)
+
+    def __getitem__(self, i):
+        return Road(self, int(i))
+
+    def segments(self, ids, d):
+        """Returns the index of the first vertex of the segment at planar
+          distance `d` along line `ids`, element-wise.
+        """
+        starts, ends = self.starts[ids], self.ends[ids]
+        i = np.clip(np.searchsorted(self.planar, self.planar[starts] + d, side='left'), starts, ends)
+        return np.clip(i - 1, starts, ends - 1)
+
+    def sides(self, points, ids):
+        """Vectorized `Road.side` for all `points`, where `ids[i]` is the line
+          of point i. Returns 1 right of the line, -1 left of it and 0 on it.
+          A point whose closest point is an inner vertex lies outside the turn
+          there, so it gets the outer side of the turn, whichever adjacent
+          segment it is measured against.
+        """
+        ids = np.asarray(ids)
+        points = np.asarray(points, dtype=object)
+        a = self.segments(ids, shapely.line_locate_point(self.lines[ids], points))
+        p, p1, p2 = shapely.get_coordinates(points), self.coords[a], self.coords[a + 1]
+        side = np.sign(_cross(p - p1, p2 - p1))
+        # Relative position of the projection on the segment, beyond its ends at a vertex
+        t = np.einsum('ij,ij->i', p - p1, p2 - p1)
+        before = (t <= 0) & (a > self.starts[ids])
+        after = (t >= np.einsum('ij,ij->i', p2 - p1, p2 - p1)) & (a + 1 < self.ends[ids])
+        v = np.where(after, a + 1, a)[before | after]
+        turn = np.sign(_cross(self.coords[v] - self.coords[v - 1], self.coords[v + 1] - self.coords[v]))
+        side[before | after] = np.where(turn != 0, turn, side[before | after])
+        return side
+
+
+class Road:
+    """View of a single line of a `RoadMetrics` table."""
+    def __init__(self, metrics, i):
+        self.metrics, self.i = metrics, i
+        self.line = metrics.lines[i]
+        self.start, self.end = metrics.starts[i], metrics.ends[i]
+
+    @property
+    def planar_length(self):
+        return self.metrics.planar[self.end] - self.metrics.planar[self.start]
+
+    @property
+    def length(self):
+        """Geodesic length in meters."""
+        return self.metrics.geodesic[self.end] - self.metrics.geodesic[self.start]
+
+    def _point(self, d):
+        """Returns the segment at planar distance `d` and the relative
+          position on it.
+        """
+        k = self.metrics.segments(self.i, d)
+        planar = self.metrics.planar
+        step = planar[k+1] - planar[k]
+        return k, (planar[self.start] + d - planar[k]) / step if step > 0 else 0.
+
+    def geodesic_length(self, d1, d2):
+        """Returns the geodesic length between planar distances `d1` and `d2`."""
+        geo = self.metrics.geodesic
+        (k1, r1), (k2, r2) = self._point(d1), self._point(d2)
+        return geo[k2] + r2 * (geo[k2+1] - geo[k2]) - geo[k1] - r1 * (geo[k1+1] - geo[k1])
+
+    def substring(self, d1, d2):
+        """Returns the sub-line between planar distances `d1` and `d2`. Cases
+          other than 0 <= d1 < d2 <= length are passed on to shapely.
+        """
+        if not 0 <= d1 < d2 <= self.planar_length:
+            return shapely.ops.substring(self.line, d1, d2)
+        coords, planar = self.metrics.coords, self.metrics.planar[self.start:self.end+1]
+        (k1, r1), (k2, r2) = self._point(d1), self._point(d2)
+        inner = np.arange(k1 + 1, k2 + 1)
+        inner = inner[(planar[inner - self.start] > planar[0] + d1) & (planar[inner - self.start] < planar[0] + d2)]
+        return LineString(np.vstack([coords[k1] + r1 * (coords[k1+1] - coords[k1]), coords[inner],
+                                     coords[k2] + r2 * (coords[k2+1] - coords[k2])]))
+
+    def side(self, point):
+        """Determines which side of the line `point` falls on."""
+        return self.metrics.sides([point], [self.i])[0]
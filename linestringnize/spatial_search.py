@@ -1,19 +1,36 @@
+import numpy as np
+import shapely
 from rtree import index
 
 
-class RTree:
+class SpatialIndex:
+    """R-tree over the geometries of a GeoDataFrame. The tree is bulk loaded
+      from an array of bounds and the geometries are kept in a contiguous
+      array, hence ids are integer positions in `df`.
+    """
     def __init__(self, df, NUM_KNN=10):
         self.NUM_KNN = NUM_KNN
         self.df = df
-        self.idx = self.build_rtee(self.df)
+        self.geoms = np.asarray(df.geometry)
+        self.bounds = shapely.bounds(self.geoms)
+        self.idx = self.build_rtee(self.bounds)
 
-    def build_rtee(self, df):
-        """Builds an R-Tree of the given geometries in `df`."""
-        assert len(df) == df.index.nunique()
-        idx = index.Index()
-        for i, row in df.iterrows():
-            idx.insert(i, row['geometry'].bounds)
-        return idx
+    def __getstate__(self):
+        """The index itself is not picklable and is rebuilt on unpickling."""
+        return {'NUM_KNN': self.NUM_KNN, 'df': self.df}
+
+    def __setstate__(self, state):
+        SpatialIndex.__init__(self, state['df'], state['NUM_KNN'])
+
+    def build_rtee(self, bounds):
+        """Builds an R-Tree of the given `bounds` by bulk loading."""
+        if len(bounds) == 0:
+            return index.Index()
+        try:
+            return index.Index((np.arange(len(bounds)), bounds[:, :2], bounds[:, 2:]))
+        except NotImplementedError:
+            # Array bulk loading requires libspatialindex >= 2.1
+            return index.Index((i, tuple(b), None) for i, b in enumerate(bounds))
 
     def nearest_ids(self, bounds):
         return list(self.idx.nearest(bounds, num_results=self.NUM_KNN))
@@ -21,5 +38,21 @@ class RTree:
     def intersection(self, bounds):
         return list(self.idx.intersection(bounds))
 
+    def nearest_many(self, bounds):
+        """Returns an array of the nearest ids for every row of `bounds`."""
+        bounds = np.asarray(bounds, dtype=float).reshape(-1, 4)
+        if len(bounds) == 0:
+            return []
+        ids, counts = self.idx.nearest_v(bounds[:, :2], bounds[:, 2:], num_results=self.NUM_KNN)
+        return np.split(ids, np.cumsum(counts)[:-1])
+
+    def intersection_many(self, bounds):
+        """Returns an array of the intersecting ids for every row of `bounds`."""
+        bounds = np.asarray(bounds, dtype=float).reshape(-1, 4)
+        if len(bounds) == 0:
+            return []
+        ids, counts = self.idx.intersection_v(bounds[:, :2], bounds[:, 2:])
+        return np.split(ids, np.cumsum(counts)[:-1])
+
     def get_id(self, id):
-        return self.df.loc[id, 'geometry']
+        return self.geoms[id]
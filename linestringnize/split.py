@@ -3,27 +3,31 @@ Source: https://github.com/Toblerity/Shapely/blob/master/shapely/ops.py#L489
 The modifications below provide a significant performance gain by using an RTree.
 """
 import geopandas as gpd
+import shapely
 import shapely.ops
 from shapely.geometry import GeometryCollection
 
-from spatial_search import RTree
+from spatial_search import SpatialIndex
 
 
-def _split_line_with_multipoint(line, rtree):
+def _split_line_with_multipoint(line, points):
     chunks = [line]
-    for pt in rtree.get_id(rtree.intersection(line.bounds)):
+    for pt in points:
         new_chunks = []
         for chunk in filter(lambda x: not x.is_empty, chunks):
             # add the newly split 2 lines or the same line if not split
-            new_chunks.extend(shapely.ops.split(chunk, pt))
+            new_chunks.extend(shapely.ops.split(chunk, pt).geoms)
         chunks = new_chunks
     return chunks
 
 
 def split(geom, splitter):
     """Splits a geometry by another geometry and returns a collection of geometries."""
-    if geom.type == 'MultiLineString' and splitter.type == 'MultiPoint':
-        rtree = RTree(gpd.GeoDataFrame(geometry=[p for p in splitter]))
-        return GeometryCollection([i for part in geom.geoms for i in _split_line_with_multipoint(part, rtree)])
+    if geom.geom_type == 'MultiLineString' and splitter.geom_type == 'MultiPoint':
+        spatial_index = SpatialIndex(gpd.GeoDataFrame(geometry=list(splitter.geoms)))
+        parts = list(geom.geoms)
+        candidates = spatial_index.intersection_many(shapely.bounds(parts))
+        return GeometryCollection([i for part, ids in zip(parts, candidates) \
+                                     for i in _split_line_with_multipoint(part, spatial_index.get_id(ids))])
     else:
         return shapely.ops.split(geom, splitter)
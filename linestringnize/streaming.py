@@ -0,0 +1,138 @@
+"""
+Tiled pipeline for very large inputs. Points are partitioned into square
+tiles, and every tile is processed end to end with its own road network.
+Each tile also reads the points within a halo around it, so block groups
+crossing the tile edge are complete. A group is only kept by the tile that
+contains its first point, hence every group is output exactly once. Lines are
+trimmed against the lines of all groups within the halo.
+All input points are held in memory, reduced to their ID columns, and
+identical geometries are merged over the whole input. Road networks, groups
+and lines only exist for one tile at a time, and output is written tile by
+tile. A local OSM file is read once, and the network of every tile is cut
+from its compact arrays.
+"""
+import warnings
+import numpy as np
+import pandas as pd
+
+import utils
+import geodesic
+import osm_file
+import projection
+import profiling
+import linestringnize as pipeline
+from osm_roads import OSM
+from osm_to_geojson import osm_to_geojson
+from query_overpass import snap_bounds, DEFAULT_TILE_SIZE
+
+
+DEFAULT_HALO = 500. # meters
+DEFAULT_CHUNKSIZE = 100000 # features
+
+
+def load_file(path, columns, chunksize=DEFAULT_CHUNKSIZE):
+    """Reads `path` chunk by chunk and returns its single Points, of which
+      only `columns` are kept, and all other single geometries with all
+      their properties.
+    """
+    points, other = [], []
+    for df in utils.iter_file(path, chunksize):
+        df_points, df_other = utils.filter_geometry(utils.to_single_geometry(df), 'Point')
+        points.append(df_points[list(columns) + [df_points.geometry.name]])
+        other.append(df_other)
+    if not points:
+        return utils.filter_geometry(utils.load_file(path), 'Point')
+    return pd.concat(points, ignore_index=True), pd.concat(other, ignore_index=True)
+
+
+def tile_grid(df, tile_size):
+    """Returns the local metric coordinates of all points in `df` and their
+      (column, row) tile indexes.
+    """
+    transformer = projection.transformer(projection.WGS84, projection.local_crs(df.total_bounds))
+    xy = np.column_stack(transformer.transform(*geodesic.to_xy(df.geometry).T))
+    return xy, np.floor(xy / tile_size).astype(int)
+
+
+def tile_buckets(tiles):
+    """Returns a dict mapping every (column, row) tile to the positions of its
+      points, sorted.
+    """
+    order = np.lexsort((tiles[:, 1], tiles[:, 0]))
+    keys, starts = np.unique(tiles[order], axis=0, return_index=True)
+    return {tuple(key): np.sort(bucket) for key, bucket in \
+            zip(keys.tolist(), np.split(order, starts[1:]))}
+
+
+def tile_network(bbox, extract=None, NUM_KNN=10, tile_size=DEFAULT_TILE_SIZE, **osm_options):
+    """Returns the road network of `bbox`. If the `osm_file.Elements`
+      `extract` is given, the network is cut from it as `OSM` reads it
+      from a file, without the road cache.
+    """
+    if extract is None:
+        return OSM(bbox, NUM_KNN, tile_size=tile_size, **osm_options)
+    if tile_size:
+        bbox = snap_bounds(bbox, tile_size)
+    with profiling.stage('osm_to_geojson'):
+        df = osm_to_geojson(osm_file.select(extract, bbox))
+    osm = OSM.from_dataframe(df, NUM_KNN)
+    osm.bbox = tuple(bbox)
+    return osm
+
+
+def owned_groups(df, core):
+    """Returns a mask of all points in `df` whose group's first point is
+      in `core`.
+    """
+    first = df.index.to_series().groupby(df[pipeline.GROUP].values, sort=False).transform('min')
+    return core[df.index.get_indexer(first)]
+
+
+def process_tiles(df_points, tile_size, halo, location_id, child_id, max_distance, min_length,
+                  clipping, stats=True, workers=1, score='sum', **osm_options):
+    """Yields the LineStrings of `df_points` tile by tile. `osm_options` are
+      passed on to `OSM`. Points are bucketed by tile once, and every tile
+      only scans the buckets within its halo.
+    """
+    if len(df_points) == 0:
+        return
+    xy, tiles = tile_grid(df_points, tile_size)
+    buckets = tile_buckets(tiles)
+    reach = int(np.ceil(halo / tile_size))
+    extract = None
+    if osm_options.get('osm_file'):
+        # Read once, the snapped bounds of every tile lie within the snapped total bounds
+        bbox = utils.extend_bounds(df_points.total_bounds, pipeline._EXTEND_BBOX)
+        if osm_options.get('tile_size', DEFAULT_TILE_SIZE):
+            bbox = snap_bounds(bbox, osm_options.get('tile_size', DEFAULT_TILE_SIZE))
+        with profiling.stage('fetch_roads'):
+            extract = osm_file.read_roads(osm_options.pop('osm_file'), bbox)
+    for tile in sorted(buckets):
+        lower = np.array(tile) * tile_size - halo
+        upper = (np.array(tile) + 1) * tile_size + halo
+        near = [buckets[(tile[0] + i, tile[1] + j)] for i in range(-reach, reach + 1) \
+                for j in range(-reach, reach + 1) if (tile[0] + i, tile[1] + j) in buckets]
+        index = np.sort(np.concatenate(near))
+        index = index[np.all((xy[index] >= lower) & (xy[index] < upper), axis=1)]
+        df = df_points.iloc[index].copy()
+        core = np.all(tiles[index] == tile, axis=1)
+        osm = tile_network(utils.extend_bounds(df.total_bounds, pipeline._EXTEND_BBOX), extract,
+                           **osm_options)
+        with profiling.stage('group_by_block'):
+            df = pipeline.group_by_block(df, osm)
+        with profiling.stage('group_by_distance'):
+            df = pipeline.group_by_distance(df, max_distance, osm, workers)
+        owned = owned_groups(df, core)
+        rim = np.minimum(xy[index] - lower, upper - xy[index]).min(axis=1)
+        if np.any(owned & ~core & (rim < max_distance)):
+            warnings.warn('Block groups of tile %s reach the edge of its halo, consider a larger halo.' \
+                          % (tile,))
+        if not owned.any():
+            continue
+        # Lines of the halo are built too, so owned lines are trimmed as in a single run
+        with profiling.stage('to_linestring'):
+            df_lines = pipeline.to_linestring(df, osm, location_id, min_length, clipping,
+                                              stats, child_id, workers, score)
+        with profiling.stage('remove_intersections'):
+            df_lines = pipeline.remove_intersections(df_lines, 0, workers)
+        yield df_lines[np.isin(df[pipeline.GROUP].unique(), df.loc[owned, pipeline.GROUP].unique())]
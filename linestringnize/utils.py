@@ -1,25 +1,68 @@
 import json
-import pyproj
 import numpy as np
 import pandas as pd
 import geopandas as gpd
+import shapely
 import shapely.ops
 import shapely.affinity
 from shapely.geometry import Point, LineString, Polygon
 
-
-_GEOD = pyproj.Geod(ellps='WGS84')
+import geodesic
+import writers
 
 
 def GEOD():
-    return _GEOD
+    return geodesic.GEOD()
+
+
+def _is_parquet(path):
+    return path.lower().endswith(('.parquet', '.geoparquet'))
+
 
 def load_file(path):
+    if _is_parquet(path):
+        return gpd.read_parquet(path).reset_index(drop=True)
     return gpd.read_file(path).reset_index(drop=True)
 
 
-def save_file(df, path):
-    json.dump(json.loads(df.to_json()), open(path, 'w'))
+def iter_file(path, chunksize=100000):
+    """Yields the features in `path` as GeoDataFrames of at most `chunksize`
+      rows, so large inputs are never read at once.
+    """
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+        reader = pq.ParquetFile(path)
+        metadata = json.loads(reader.schema_arrow.metadata[b'geo'])
+        column = metadata['primary_column']
+        crs = metadata['columns'][column].get('crs', 'EPSG:4326')
+        for batch in reader.iter_batches(batch_size=chunksize):
+            yield _from_wkb(batch.to_pandas(), column, crs)
+        return
+    import pyogrio
+    with pyogrio.open_arrow(path, batch_size=chunksize, use_pyarrow=True) as (metadata, reader):
+        for batch in reader:
+            yield _from_wkb(batch.to_pandas(), metadata['geometry_name'] or 'wkb_geometry',
+                            metadata['crs'])
+
+
+def _from_wkb(df, column, crs):
+    return gpd.GeoDataFrame(df.drop(columns=column),
+                            geometry=gpd.GeoSeries.from_wkb(df[column], crs=crs))
+
+
+def load_ids(path, column):
+    """Loads IDs from a text file with one ID per line or from the property
+      `column` of any other file.
+    """
+    if path.endswith('.txt'):
+        return [line.strip() for line in open(path) if line.strip()]
+    return gpd.read_file(path)[column].astype(str).tolist()
+
+
+def save_file(df, path, precision=None):
+    """Writes `df` to `path`, the format is chosen by `writers.open_writer`."""
+    with writers.open_writer(path, precision) as writer:
+        writer.write(df)
 
 
 def filter_geometry(df, geom_type):
@@ -38,16 +81,26 @@ def shift(lon, lat, deg, dist):
     return GEOD().fwd(lon, lat, deg, dist)[:2]
 
 
+def extend_bounds(bounds, dist):
+    """Extends bounds by a given distance (meters) towards south-west and north-east."""
+    return shift(bounds[0], bounds[1], 225, dist) + shift(bounds[2], bounds[3], 45, dist)
+
+
 def distance(geom1, geom2):
     """Returns the distance between two geometries in meters."""
     if not isinstance(geom1, Point) or not isinstance(geom2, Point):
         geom1, geom2 = shapely.ops.nearest_points(geom1, geom2)
-    return GEOD().inv(geom1.x, geom1.y, geom2.x, geom2.y)[2]
+    return float(geodesic.distances(geom1.x, geom1.y, geom2.x, geom2.y))
+
+
+def distances(geoms, geom):
+    """Returns the distances in meters between all `geoms` and `geom`."""
+    return geodesic.geometry_distances(geoms, geom)
 
 
 def line_length(l):
     """Returns the total length of a LineString in meters."""
-    return sum([distance(Point(p1), Point(p2)) for p1, p2 in zip(l.coords, l.coords[1:])])
+    return geodesic.length(l.coords)
 
 
 def side(p, line):
@@ -64,16 +117,13 @@ def to_circle(p, radius, n=36):
 
 def to_single_geometry(df):
     """Converts all multi geometries into single geometries."""
-    rows = []
-    for _, row in df.iterrows():
-        if row['geometry'].geom_type in ('MultiPoint', 'MultiLineString', 'MultiPolygon'):
-            for g in row['geometry']:
-                r = row.copy()
-                r['geometry'] = g
-                rows.append(r)
-        else:
-            rows.append(row)
-    return gpd.GeoDataFrame(rows, index=np.arange(len(rows)))
+    geoms = np.asarray(df.geometry)
+    multi = np.isin(shapely.get_type_id(geoms), (4, 5, 6))
+    rows = np.repeat(np.arange(len(df)), np.where(multi, shapely.get_num_geometries(geoms), 1))
+    parts = geoms[rows]
+    parts[multi[rows]] = shapely.get_parts(geoms[multi])
+    df = df.iloc[rows]
+    return df.set_geometry(gpd.GeoSeries(parts, index=df.index, crs=df.crs)).reset_index(drop=True)
 
 
 def closest_segment(point, line):
@@ -104,3 +154,20 @@ def translate(geom, xoff=0.0, yoff=0.0, zoff=0.0):
 def split(geom, splitter):
     """Splits a geometry by another geometry and returns a collection of geometries."""
     return shapely.ops.split(geom, splitter)
+
+
+def connected_components(n, i, j):
+    """Returns the component of each of `n` nodes connected by the edges
+      `i[k]`-`j[k]`, labelled by its lowest node.
+    """
+    labels = np.arange(n)
+    i, j = np.asarray(i, dtype=np.int64), np.asarray(j, dtype=np.int64)
+    while True:
+        low = np.minimum(labels[i], labels[j])
+        previous = labels.copy()
+        np.minimum.at(labels, i, low)
+        np.minimum.at(labels, j, low)
+        # Points every node to the label of its label until stable
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
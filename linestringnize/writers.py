@@ -0,0 +1,180 @@
+"""
+Writers which append GeoDataFrames to an output file incrementally. The
+format is chosen by file extension, see `open_writer`.
+"""
+import os
+import json
+import numpy as np
+import shapely
+import pandas as pd
+import geopandas as gpd
+
+
+def _json_default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError('Object of type %s is not JSON serializable.' % type(obj).__name__)
+
+
+def _missing(dtype, index):
+    """Returns a Series of missing values of `dtype`, integers and booleans
+      become nullable.
+    """
+    if dtype.kind in 'iu':
+        dtype = 'Int64'
+    elif dtype.kind == 'b':
+        dtype = 'boolean'
+    return pd.Series(None, index=index, dtype=dtype)
+
+
+def round_coordinates(df, precision):
+    """Returns `df` with all coordinates rounded to `precision` decimals."""
+    if precision is None or len(df) == 0:
+        return df
+    geoms = shapely.transform(np.asarray(df.geometry), lambda xy: np.round(xy, precision))
+    return df.set_geometry(gpd.GeoSeries(geoms, index=df.index, crs=df.crs))
+
+
+class Writer:
+    """Base class of all writers. Subclasses implement `_write` and `_close`.
+      Unless `align` is False, all chunks are written with the columns of
+      the first chunk and of all frames passed to `reserve`, missing values
+      are null.
+      Arguments:
+        path: String. Path to the output file.
+        precision: Integer or None. If set, coordinates are rounded to this
+          number of decimals.
+    """
+    align = True
+
+    def __init__(self, path, precision=None):
+        self.path = path
+        self.precision = precision
+        self.columns = None
+        self.dtypes = {}
+        self.count = 0
+
+    def reserve(self, df):
+        """Adds the columns of `df`, which is written later, to the output.
+          Has to be called before the first `write`.
+        """
+        if self.columns is not None:
+            raise ValueError('Columns have to be reserved before the first write.')
+        for column, dtype in df.dtypes.items():
+            self.dtypes.setdefault(column, dtype)
+        self._reserve(df)
+
+    def _reserve(self, df):
+        pass
+
+    def write(self, df):
+        if len(df) == 0:
+            return
+        if self.columns is None:
+            self.columns = list(df.columns) + [c for c in self.dtypes if c not in df.columns]
+            for column, dtype in df.dtypes.items():
+                self.dtypes.setdefault(column, dtype)
+        if self.align:
+            missing = [c for c in self.columns if c not in df.columns]
+            df = df.assign(**{c: _missing(self.dtypes[c], df.index) for c in missing})[self.columns]
+        self._write(round_coordinates(df, self.precision))
+        self.count += len(df)
+
+    def close(self):
+        self._close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class GeoJSONWriter(Writer):
+    """Writes a GeoJSON FeatureCollection one GeoDataFrame at a time.
+      Features carry their own properties, so chunks are not aligned. Feature
+      ids count up over all chunks.
+    """
+    align = False
+
+    def __init__(self, path, precision=None):
+        Writer.__init__(self, path, precision)
+        self.file = open(path, 'w')
+        self.file.write('{"type": "FeatureCollection", "features": [')
+
+    def _write(self, df):
+        df = df.set_axis(range(self.count, self.count + len(df)))
+        lines = [json.dumps(feature, default=_json_default) for feature in df.iterfeatures(na='null')]
+        self.file.write(',\n' if self.count else '\n')
+        self.file.write(',\n'.join(lines))
+
+    def _close(self):
+        self.file.write('\n]}\n')
+        self.file.close()
+
+
+class ParquetWriter(Writer):
+    """Writes a GeoParquet file with one row group per GeoDataFrame. Column
+      types are unified over the first chunk and all reserved frames.
+    """
+    def __init__(self, path, precision=None):
+        Writer.__init__(self, path, precision)
+        self.writer = None
+        self.reserved = []
+
+    def _table(self, df):
+        import pyarrow as pa
+        return pa.table(df.to_arrow(index=False, geometry_encoding='WKB'))
+
+    def _reserve(self, df):
+        self.reserved.append(self._table(df).schema)
+
+    def _metadata(self, df):
+        column = {'encoding': 'WKB', 'geometry_types': []}
+        if df.crs is not None:
+            column['crs'] = df.crs.to_json_dict()
+        return {b'geo': json.dumps({'version': '1.0.0', 'primary_column': df.geometry.name,
+                                    'columns': {df.geometry.name: column}})}
+
+    def _write(self, df):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        table = self._table(df)
+        if self.writer is None:
+            schema = pa.unify_schemas([table.schema] + self.reserved, promote_options='permissive')
+            self.schema = schema.with_metadata(self._metadata(df))
+            self.writer = pq.ParquetWriter(self.path, self.schema)
+        self.writer.write_table(table.cast(self.schema))
+
+    def _close(self):
+        if self.writer is None:
+            gpd.GeoDataFrame(geometry=[]).to_parquet(self.path)
+        else:
+            self.writer.close()
+
+
+class FlatGeobufWriter(Writer):
+    """Writes a FlatGeobuf file by appending every GeoDataFrame."""
+    def __init__(self, path, precision=None):
+        Writer.__init__(self, path, precision)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def _write(self, df):
+        import pyogrio
+        pyogrio.write_dataframe(df, self.path, driver='FlatGeobuf', geometry_type='Unknown',
+                                append=self.count > 0)
+
+    def _close(self):
+        if self.count == 0:
+            gpd.GeoDataFrame(geometry=[]).to_file(self.path, driver='FlatGeobuf')
+
+
+_WRITERS = {'.parquet': ParquetWriter, '.geoparquet': ParquetWriter, '.fgb': FlatGeobufWriter}
+
+
+def open_writer(path, precision=None):
+    """Returns a writer for `path`: GeoParquet for .parquet/.geoparquet,
+      FlatGeobuf for .fgb and GeoJSON otherwise.
+    """
+    return _WRITERS.get(os.path.splitext(path)[1].lower(), GeoJSONWriter)(path, precision)
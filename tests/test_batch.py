@@ -0,0 +1,23 @@
+import json
+import geopandas as gpd
+import pyarrow.parquet as pq
+from shapely.geometry import Point, LineString
+
+import batch
+
+
+def test_input_bounds(tmp_path):
+    df = gpd.GeoDataFrame({'A': [1, 2]}, geometry=[Point(8.5, 47.3), LineString([(8.4, 47.4), (8.6, 47.2)])],
+                          crs='EPSG:4326')
+    expected = (8.4, 47.2, 8.6, 47.4)
+    df.to_parquet(tmp_path / 'a.parquet')
+    df.to_file(tmp_path / 'a.geojson')
+    assert batch.input_bounds(str(tmp_path / 'a.parquet')) == expected
+    assert batch.input_bounds(str(tmp_path / 'a.geojson')) == expected
+    # Without a bbox in the metadata, the geometry column is read
+    table = pq.read_table(tmp_path / 'a.parquet')
+    metadata = json.loads(table.schema.metadata[b'geo'])
+    del metadata['columns']['geometry']['bbox']
+    table = table.replace_schema_metadata(dict(table.schema.metadata, geo=json.dumps(metadata)))
+    pq.write_table(table, tmp_path / 'b.parquet')
+    assert batch.input_bounds(str(tmp_path / 'b.parquet')) == expected
@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+import geodesic
+
+
+def random_pairs(n, seed=0):
+    """Returns `n` random coordinate pairs between 10 m and 100 km apart,
+      starting at latitudes up to 85 degrees.
+    """
+    rng = np.random.default_rng(seed)
+    lon1, lat1 = rng.uniform(-180., 180., n), rng.uniform(-85., 85., n)
+    azimuth, d = rng.uniform(-180., 180., n), 10**rng.uniform(1., 5., n)
+    lon2, lat2, _ = geodesic.GEOD().fwd(lon1, lat1, azimuth, d)
+    return lon1, lat1, np.asarray(lon2), np.asarray(lat2)
+
+
+@pytest.mark.parametrize('tolerance', [0.001, 0.01, 0.1, 1.])
+def test_local_distances_are_within_tolerance(tolerance):
+    lon1, lat1, lon2, lat2 = random_pairs(100000)
+    exact = geodesic.distances(lon1, lat1, lon2, lat2, method=geodesic.GEODESIC)
+    local = geodesic.distances(lon1, lat1, lon2, lat2, method=geodesic.LOCAL, tolerance=tolerance)
+    assert np.abs(local - exact).max() <= tolerance
+    # Most pairs are approximated, not computed exactly
+    assert np.mean(local != exact) > 0.5
+
+
+def test_local_distances_near_the_antimeridian():
+    lon1, lat1 = np.full(1000, 179.99), np.linspace(-85., 85., 1000)
+    lon2, lat2, _ = geodesic.GEOD().fwd(lon1, lat1, np.full(1000, 90.), np.full(1000, 5000.))
+    assert np.all(np.asarray(lon2) < 0.)
+    exact = geodesic.distances(lon1, lat1, lon2, lat2, method=geodesic.GEODESIC)
+    local = geodesic.distances(lon1, lat1, lon2, lat2, method=geodesic.LOCAL, tolerance=0.01)
+    assert np.abs(local - exact).max() <= 0.01
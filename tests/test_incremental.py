@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+import synthetic
+import incremental
+import linestringnize as pipeline
+from osm_roads import OSM
+from osm_to_geojson import osm_to_geojson
+
+
+PARAMS = {'location_id': 'LocationNumbers', 'child_id': 'ID', 'max_distance': 50., 'min_length': 30.,
+          'clipping': 5.}
+
+
+def run(df, osm):
+    df = pipeline.prepare(df, PARAMS['location_id'], PARAMS['child_id'])
+    return pipeline.linestringnize(df, osm, **PARAMS).reset_index(drop=True)
+
+
+def normalized(df):
+    ids = df[pipeline.AGG_IDS].map(lambda ids: ','.join(sorted(ids.split(','))))
+    return dict(zip(ids, df.geometry))
+
+
+@pytest.mark.parametrize('seed', [0, 1])
+def test_update_equals_full_run(seed):
+    data = synthetic.street_network(8, 8, irregular=True, seed=seed)
+    osm = OSM.from_dataframe(osm_to_geojson(data))
+    df = synthetic.street_points(data, density=0.05, seed=seed)
+    previous = run(df, osm)
+    rng = np.random.default_rng(seed)
+    moved = rng.choice(len(df), 20, replace=False)
+    removed = rng.choice(np.setdiff1d(np.arange(len(df)), moved), 10, replace=False)
+    current = df.copy()
+    current.loc[moved, 'geometry'] = current.geometry[moved].translate(2e-4, 1e-4)
+    current = current.drop(index=removed)
+    changed = df['ID'][np.concatenate([moved, removed])]
+    points = pipeline.prepare(current, PARAMS['location_id'], PARAMS['child_id'])
+    updated = incremental.update(previous, points, changed, osm, **PARAMS)
+    expected, actual = normalized(run(current, osm)), normalized(updated)
+    assert sorted(actual) == sorted(expected)
+    for ids, line in expected.items():
+        assert actual[ids].equals_exact(line, 1e-9), ids
@@ -0,0 +1,51 @@
+import geopandas as gpd
+from shapely.geometry import Point, LineString, MultiLineString
+
+import synthetic
+import linestringnize as pipeline
+from osm_roads import OSM
+from osm_to_geojson import osm_to_geojson
+
+
+def test_merge_identical_geometries_keeps_missing_geometries_apart():
+    df = gpd.GeoDataFrame({'A': ['1', '2', '3', '4']},
+                          geometry=[LineString([(0, 0), (1, 1)]), None, None, Point(0, 0)])
+    merged = pipeline.merge_identical_geometries(df, 'A')
+    assert merged['A'].tolist() == ['1', '2,3', '4']
+    assert merged.geometry.iloc[2] == Point(0, 0)
+
+
+def test_merge_identical_geometries_keys_empty_points():
+    df = gpd.GeoDataFrame({'A': ['1', '2', '3', '4']},
+                          geometry=[Point(0, 0), Point(), Point(0, 0), Point()])
+    merged = pipeline.merge_identical_geometries(df, 'A')
+    assert merged['A'].tolist() == ['1,3', '2,4']
+    assert merged.geometry.iloc[1].is_empty
+
+
+def test_split_cuts_out_overlaps_and_splits_at_crossings():
+    line = LineString([(0, 0), (0.001, 0)])
+    cross = LineString([(0.0002, -0.0001), (0.0002, 0.0001)])
+    overlap = LineString([(0.0008, 0), (0.0012, 0)])
+    result = pipeline.split(line, MultiLineString([cross, overlap]), 0)
+    assert result.equals(LineString([(0.0002, 0), (0.0008, 0)]))
+
+
+def test_projected_network_is_shared_by_point_layers():
+    data = synthetic.street_network(3, 3)
+    osm = OSM.from_dataframe(osm_to_geojson(data))
+    df = synthetic.street_points(data, density=0.05, seed=0)
+    first = pipeline.to_projected(df.iloc[:10], osm)[1]
+    second = pipeline.to_projected(df.iloc[10:], osm)[1]
+    assert first is second and first.crs is not None
+
+
+def test_merge_tolerance_clusters_points_by_distance():
+    # 1 cm apart across any grid cell edge, a chain of three and one point further away
+    step = 0.01 / 111320.
+    points = [Point(8.5 + 0.5 * step, 47.3), Point(8.5 - 0.5 * step, 47.3), Point(0., 60.),
+              Point(0., 60. + 0.8 * step), Point(0., 60. + 1.6 * step), Point(0., 60. + 4. * step)]
+    df = gpd.GeoDataFrame({'A': ['1', '2', '3', '4', '5', '6']}, geometry=points)
+    merged = pipeline.merge_identical_geometries(df, 'A', tolerance=0.02)
+    assert merged['A'].tolist() == ['1,2', '3,4,5', '6']
+    assert pipeline.geometry_keys(points).tolist() == list(range(6))
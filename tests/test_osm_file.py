@@ -0,0 +1,40 @@
+import pytest
+
+import osm_file
+from test_streaming import write_osm
+
+
+def network():
+    nodes = {1: (0.0, 0.0), 2: (0.0, 1.0), 3: (1.0, 0.5), 4: (-0.5, 0.5), 5: (1.5, 0.5), 6: (2.0, 2.0),
+             7: (3.0, 3.0)}
+    ways = {10: [1, 2], 11: [4, 5], 12: [6, 7], 13: [1, 3]}
+    elements = [{'type': 'node', 'id': i, 'lon': lon, 'lat': lat} for i, (lon, lat) in nodes.items()]
+    elements += [{'type': 'way', 'id': i, 'nodes': refs, 'tags': {'highway': 'residential'}} \
+                 for i, refs in ways.items()]
+    elements.append({'type': 'way', 'id': 14, 'nodes': [1, 3], 'tags': {'highway': 'footway'}})
+    return {'elements': elements}
+
+
+def test_read_roads_keeps_crossing_ways(tmp_path):
+    path = str(tmp_path / 'roads.osm')
+    write_osm(network(), path)
+    elements = osm_file.read_roads(path, (0.2, 0.2, 0.8, 0.8))
+    # Way 11 crosses the bounds without a node inside, way 12 is outside
+    assert sorted(elements.way_ids.tolist()) == [11, 13]
+    assert elements.ids.tolist() == [1, 3, 4, 5]
+    assert elements.coords.tolist() == [[0., 0.], [1., 0.5], [-0.5, 0.5], [1.5, 0.5]]
+
+
+def test_read_roads_without_bounds_keeps_all_roads(tmp_path):
+    path = str(tmp_path / 'roads.osm')
+    write_osm(network(), path)
+    assert sorted(osm_file.read_roads(path).way_ids.tolist()) == [10, 11, 12, 13]
+
+
+def test_read_roads_fails_on_missing_nodes(tmp_path):
+    data = network()
+    data['elements'] = [e for e in data['elements'] if e.get('id') != 7]
+    path = str(tmp_path / 'roads.osm')
+    write_osm(data, path)
+    with pytest.raises(ValueError):
+        osm_file.read_roads(path, (0.2, 0.2, 0.8, 0.8))
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+import synthetic
+from osm_to_geojson import osm_to_geojson
+
+
+def segments(df):
+    """Returns the set of all line segments in `df`, independent of the
+      direction and merging of the lines.
+    """
+    result = set()
+    for line in df.geometry:
+        xy = np.round(np.asarray(line.coords), 9)
+        for a, b in zip(map(tuple, xy[:-1]), map(tuple, xy[1:])):
+            result.add((min(a, b), max(a, b)))
+    return result
+
+
+def endpoints(df):
+    return sorted(tuple(np.round(p, 9)) for line in df.geometry for p in (line.coords[0], line.coords[-1]))
+
+
+@pytest.mark.parametrize('irregular', [False, True])
+def test_graph_method_matches_geometric_method(irregular):
+    data = synthetic.street_network(12, 10, irregular=irregular, seed=3)
+    graph, geometric = osm_to_geojson(data, 'graph'), osm_to_geojson(data, 'geometric')
+    assert len(graph) == len(geometric)
+    assert segments(graph) == segments(geometric)
+    assert endpoints(graph) == endpoints(geometric)
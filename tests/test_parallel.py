@@ -0,0 +1,36 @@
+import multiprocessing
+
+import geodesic
+import parallel
+import profiling
+
+
+def distance_settings(group, shared):
+    return geodesic.method(), geodesic._config['tolerance'], shared
+
+
+def test_workers_use_distance_settings_with_spawn(monkeypatch):
+    monkeypatch.setattr(parallel, '_context', lambda: multiprocessing.get_context('spawn'))
+    with geodesic.using(geodesic.PLANAR, 0.5):
+        results = parallel.map_groups(distance_settings, range(4), workers=2, shared='osm')
+    assert results == [(geodesic.PLANAR, 0.5, 'osm')] * 4
+
+
+@profiling.timed
+def record_group(group, shared):
+    profiling.record_sizes('group_size', [group])
+    return group
+
+
+def test_worker_recordings_are_merged():
+    profiling.reset()
+    profiling.enable()
+    try:
+        record_group(1, None)
+        assert parallel.map_groups(record_group, range(1, 9), workers=2) == list(range(1, 9))
+        report = profiling.report()
+    finally:
+        profiling.disable()
+        profiling.reset()
+    assert report['functions']['record_group']['calls'] == 9
+    assert sum(report['histograms']['group_size'].values()) == 9
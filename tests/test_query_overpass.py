@@ -0,0 +1,68 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+
+import synthetic
+import query_overpass
+from osm_to_geojson import Elements
+
+
+class Overpass(BaseHTTPRequestHandler):
+    """Stub Overpass server which answers every query with the same network
+      and fails the first `failures` requests.
+    """
+    requests, failures = 0, 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        cls = type(self)
+        cls.requests += 1
+        if cls.requests <= cls.failures:
+            self.send_response(504)
+            self.end_headers()
+            return
+        body = json.dumps(synthetic.street_network(3, 3)).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    handler = type('Handler', (Overpass,), {})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(query_overpass, 'RETRY_BACKOFF', 0.)
+    monkeypatch.setenv('NO_PROXY', '127.0.0.1')
+    yield handler, 'http://127.0.0.1:%d/' % server.server_port
+    server.shutdown()
+
+
+def test_tiles_at_grid_edges():
+    assert query_overpass.get_tiles((0., 0., 0.04, 0.02), 0.02) == [(0, 0), (1, 0)]
+    assert query_overpass.get_tiles((-0.01, 0.02, 0.01, 0.03), 0.02) == [(-1, 1), (0, 1)]
+    assert query_overpass.get_tiles((0.005, 0.005, 0.005, 0.005), 0.02) == [(0, 0)]
+    assert query_overpass.snap_bounds((0.005, 0.005, 0.025, 0.015), 0.02) == (0., 0., 0.04, 0.02)
+
+
+def test_query_retries_deduplicates_and_reuses_tiles(endpoint, tmp_path):
+    handler, url = endpoint
+    handler.failures = 1
+    bounds = (-123.11, 49.27, -123.09, 49.29)
+    data = query_overpass.query_overpass(bounds, cache=str(tmp_path), endpoint=url, tile_size=0.01)
+    tiles = len(query_overpass.get_tiles(bounds, 0.01))
+    assert tiles == 4 and handler.requests == tiles + 1
+    expected = synthetic.street_network(3, 3)['elements']
+    elements = Elements(data['elements'])
+    assert elements.ids.tolist() == sorted(e['id'] for e in expected if e['type'] == 'node')
+    assert sorted(elements.way_ids.tolist()) == sorted(e['id'] for e in expected if e['type'] == 'way')
+    shifted = (-123.108, 49.272, -123.092, 49.288)
+    data = query_overpass.query_overpass(shifted, cache=str(tmp_path), endpoint=url, tile_size=0.01)
+    assert len(list(data['elements'])) == tiles * len(expected)
+    assert handler.requests == tiles + 1
+    assert not list(tmp_path.glob('*.part'))
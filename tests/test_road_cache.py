@@ -0,0 +1,43 @@
+import os
+import geopandas as gpd
+import pytest
+from shapely.geometry import LineString
+
+import road_cache
+
+
+def lines(n):
+    return gpd.GeoDataFrame(geometry=[LineString([(i, 0.), (i, 1.)]) for i in range(n)])
+
+
+def entry(cache, key):
+    return os.path.join(cache, road_cache.make_filename(key))
+
+
+def test_round_trip(tmp_path):
+    cache = str(tmp_path)
+    key = road_cache.make_key((0., 0., 1., 1.))
+    assert road_cache.load(key, cache) is None
+    road_cache.save(lines(3), key, cache)
+    assert road_cache.load(key, cache).geometry.equals(lines(3).geometry)
+    assert key != road_cache.make_key((0., 0., 1., 1.), source='extract.osm')
+    assert road_cache.load(key, None) is None
+    with pytest.raises(ValueError):
+        road_cache.make_key((0., 0., 1.))
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = str(tmp_path)
+    keys = [road_cache.make_key((i, 0., i + 1., 1.)) for i in range(4)]
+    for i, key in enumerate(keys[:3]):
+        road_cache.save(lines(10), key, cache)
+        os.utime(entry(cache, key), (1000. + i, 1000. + i))
+    size = os.path.getsize(entry(cache, keys[0]))
+    # Loading the oldest entry marks it as recently used
+    road_cache.load(keys[0], cache)
+    road_cache.save(lines(10), keys[3], cache, max_size=2 * size)
+    assert [os.path.exists(entry(cache, key)) for key in keys] == [True, False, False, True]
+    # The newest entry is kept even if it exceeds the size
+    os.utime(entry(cache, keys[0]), (2000., 2000.))
+    road_cache.evict(cache, max_size=0)
+    assert sorted(os.listdir(cache)) == [road_cache.make_filename(keys[3])]
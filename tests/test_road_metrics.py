@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+import shapely
+import shapely.ops
+from shapely.geometry import Point, LineString
+
+import utils
+from road_metrics import RoadMetrics
+
+
+def random_lines(n, seed=0):
+    """Returns `n` random walks of 8 vertices with sharp turns, in degrees."""
+    rng = np.random.default_rng(seed)
+    return np.array([shapely.linestrings(np.cumsum(rng.normal(0., 1e-3, (8, 2)), axis=0) + [-123.1, 49.28]) \
+                     for _ in range(n)])
+
+
+@pytest.fixture
+def metrics():
+    return RoadMetrics(random_lines(50))
+
+
+def test_substring_and_geodesic_length_match_shapely(metrics):
+    rng = np.random.default_rng(1)
+    for i in rng.integers(0, len(metrics), 300):
+        road = metrics[i]
+        d1, d2 = np.sort(rng.uniform(0., road.planar_length, 2))
+        expected = shapely.ops.substring(road.line, d1, d2)
+        assert road.substring(d1, d2).equals_exact(expected, 1e-12)
+        # Partial segments are interpolated by their planar share
+        assert road.geodesic_length(d1, d2) == pytest.approx(utils.line_length(expected), abs=1e-3)
+    road = metrics[0]
+    assert road.substring(0., road.planar_length).equals_exact(road.line, 1e-12)
+    assert road.length == pytest.approx(utils.line_length(road.line))
+
+
+def test_sides_match_utils_side(metrics):
+    rng = np.random.default_rng(2)
+    ids = rng.integers(0, len(metrics), 3000)
+    points = shapely.line_interpolate_point(metrics.lines[ids], rng.uniform(0., 1., 3000), normalized=True)
+    points = shapely.points(shapely.get_coordinates(points) + rng.normal(0., 5e-4, (3000, 2)))
+    sides = metrics.sides(points, ids)
+    expected = np.array([utils.side(p, metrics.lines[i]) for p, i in zip(points, ids)])
+    # utils.side measures points closest to an inner vertex against the segment before it
+    at_vertex = np.array([shapely.line_locate_point(metrics.lines[i], p) in \
+                          shapely.line_locate_point(metrics.lines[i], shapely.points(metrics.lines[i].coords[1:-1])) \
+                          for p, i in zip(points, ids)])
+    assert np.array_equal(sides[~at_vertex], expected[~at_vertex])
+    assert (sides[at_vertex] != expected[at_vertex]).any()
+    assert metrics[ids[0]].side(points[0]) == sides[0]
+
+
+def test_sides_at_a_vertex_are_outside_the_turn():
+    # A hairpin turning left, points beyond its tip are right of it
+    metrics = RoadMetrics([LineString([(0., 0.), (1., 0.), (0., 0.1)])])
+    points = [Point(1.1, 0.5), Point(1.1, -0.5), Point(1.5, 0.), Point(0.5, -0.1), Point(0.5, 0.04)]
+    assert metrics.sides(points, [0] * 5).tolist() == [1, 1, 1, 1, -1]
+    # Beyond the ends, the end segments are extended
+    metrics = RoadMetrics([LineString([(0., 0.), (1., 0.), (1., 1.)])])
+    assert metrics.sides([Point(-1., 0.5), Point(0.5, 2.)], [0, 0]).tolist() == [-1, -1]
@@ -0,0 +1,45 @@
+import pandas as pd
+
+import synthetic
+import streaming
+import linestringnize as pipeline
+from osm_roads import OSM
+from osm_to_geojson import osm_to_geojson
+
+
+PARAMS = {'location_id': 'LocationNumbers', 'child_id': 'ID', 'max_distance': 50., 'min_length': 30.,
+          'clipping': 5.}
+
+
+def write_osm(data, path):
+    """Writes OSM data in JSON format as OSM XML file."""
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0"?>\n<osm version="0.6">\n')
+        for e in data['elements']:
+            if e['type'] == 'node':
+                f.write('<node id="%d" lat="%.9f" lon="%.9f"/>\n' % (e['id'], e['lat'], e['lon']))
+        for e in data['elements']:
+            if e['type'] == 'way':
+                f.write('<way id="%d">%s%s</way>\n' % (e['id'],
+                        ''.join('<nd ref="%d"/>' % n for n in e['nodes']),
+                        ''.join('<tag k="%s" v="%s"/>' % kv for kv in e['tags'].items())))
+        f.write('</osm>\n')
+
+
+def normalized(df):
+    ids = df[pipeline.AGG_IDS].map(lambda ids: ','.join(sorted(ids.split(','))))
+    return dict(zip(ids, df.geometry))
+
+
+def test_tiles_equal_single_run(tmp_path):
+    data = synthetic.street_network(10, 10, irregular=True, seed=1)
+    write_osm(data, str(tmp_path / 'roads.osm'))
+    df = pipeline.prepare(synthetic.street_points(data, density=0.05, seed=1),
+                          PARAMS['location_id'], PARAMS['child_id'])
+    full = pipeline.linestringnize(df.copy(), OSM.from_dataframe(osm_to_geojson(data)), **PARAMS)
+    tiles = streaming.process_tiles(df, 300., 250., **PARAMS, osm_file=str(tmp_path / 'roads.osm'),
+                                    cache=str(tmp_path))
+    expected, actual = normalized(full), normalized(pd.concat(list(tiles)))
+    assert sorted(actual) == sorted(expected)
+    for ids, line in expected.items():
+        assert actual[ids].equals_exact(line, 1e-9), ids
@@ -0,0 +1,49 @@
+import json
+import pytest
+import geopandas as gpd
+from shapely.geometry import Point, LineString, box
+
+import utils
+import writers
+
+
+def chunks():
+    lines = gpd.GeoDataFrame({'LocationNumbers': ['1', '2'], '_AGG_COUNT': [3, 4]},
+                             geometry=[LineString([(0, 0), (1, 1)]), LineString([(1, 0), (2, 1)])],
+                             crs='EPSG:4326')
+    other = gpd.GeoDataFrame({'ID': ['a'], 'foo': [1]}, geometry=[box(0, 0, 1, 1)], crs='EPSG:4326')
+    return lines, other
+
+
+@pytest.mark.parametrize('extension', ['parquet', 'fgb'])
+def test_reserved_columns_are_kept(tmp_path, extension):
+    lines, other = chunks()
+    path = str(tmp_path / ('out.' + extension))
+    with writers.open_writer(path) as writer:
+        writer.reserve(other)
+        writer.write(lines)
+        writer.write(other)
+    df = utils.load_file(path)
+    assert len(df) == 3
+    polygon = df[df.geom_type == 'Polygon'].iloc[0]
+    assert polygon['ID'] == 'a' and polygon['foo'] == 1
+    assert sorted(df['_AGG_COUNT'].dropna().tolist()) == [3, 4]
+
+
+def test_reserve_after_write_fails(tmp_path):
+    lines, other = chunks()
+    with writers.open_writer(str(tmp_path / 'out.parquet')) as writer:
+        writer.write(lines)
+        with pytest.raises(ValueError):
+            writer.reserve(other)
+
+
+def test_geojson_ids_are_unique_over_chunks(tmp_path):
+    lines, other = chunks()
+    path = str(tmp_path / 'out.geojson')
+    with writers.open_writer(path) as writer:
+        writer.write(lines)
+        writer.write(other)
+        writer.write(gpd.GeoDataFrame(geometry=[Point(0, 0)]))
+    ids = [feature['id'] for feature in json.load(open(path))['features']]
+    assert ids == ['0', '1', '2', '3']